@@ -0,0 +1,32 @@
+"""Compare the fast UTC timestamp decoder with `pendulum.parse`.
+
+    python benchmarks/parse_when.py
+"""
+import timeit
+
+import pendulum
+
+from zeitig import events, utils
+
+NAMES = [
+    '2018-04-01T08:00:00+00:00',
+    '2018-04-01T08:00:00.500000+00:00',
+]
+NUMBER = 20000
+
+
+def main():
+    for name in NAMES:
+        slow = timeit.timeit(lambda: pendulum.parse(name).in_tz('UTC'),
+                             number=NUMBER)
+        fast = timeit.timeit(lambda: utils.parse_utc(name), number=NUMBER)
+        validate = timeit.timeit(lambda: events.validate_when(name),
+                                 number=NUMBER)
+        print(f'{name}: pendulum.parse {slow / NUMBER * 1e6:.2f}us'
+              f' parse_utc {fast / NUMBER * 1e6:.2f}us'
+              f' validate_when {validate / NUMBER * 1e6:.2f}us'
+              f' speedup {slow / fast:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Time every stage of the sourcing and reporting pipeline.
+
+Synthetic stores of work/break/add/remove events spread over many groups are
+built in a temporary directory and the stages are timed on a fresh `Store`
+for the first group:
+
+    python benchmarks/pipeline.py [-s <events> ...] [-g <groups>] [-p]
+                                  [-o <json>]
+
+The default sizes are 10^3 to 10^5 events, add `-s 1000000` for a large store
+and `-p` to store the events in segments.
+The results are written as JSON, so they can be compared between runs.
+"""
+import argparse
+import json
+import pathlib
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import pendulum
+
+from zeitig import aggregates, events, reporting, sourcing, store, utils
+
+SIZES = [1000, 10000, 100000]
+GROUPS = 10
+SEED = 42
+
+
+def iter_events(count, seed=SEED):
+    """Generate working days of events."""
+    rnd = random.Random(seed)
+    day = pendulum.datetime(2018, 1, 1, tz='Europe/Berlin')
+    produced = 0
+    while produced < count:
+        if day.day_of_week in (pendulum.SATURDAY, pendulum.SUNDAY):
+            day = day.add(days=1)
+            continue
+        when = day.add(hours=8, minutes=rnd.randrange(60))
+        day_events = [events.WorkEvent(when=when, tags=['project'])]
+        for _ in range(rnd.randrange(2, 5)):
+            when = when.add(minutes=rnd.randrange(60, 150))
+            day_events.append(events.BreakEvent(when=when))
+            when = when.add(minutes=rnd.randrange(5, 45))
+            day_events.append(events.WorkEvent(when=when))
+            if rnd.random() < 0.3:
+                day_events.append(events.AddEvent(
+                    when=when.add(minutes=1),
+                    tags=[f'task-{rnd.randrange(20)}'],
+                    note='Did something.'))
+            if rnd.random() < 0.1:
+                day_events.append(events.RemoveEvent(
+                    when=when.add(minutes=2), tags=['project'],
+                    note='^Did'))
+        day_events.append(events.BreakEvent(
+            when=when.add(minutes=rnd.randrange(60, 150))))
+        for event in day_events[:count - produced]:
+            event.when = event.when.in_tz('UTC')
+            yield event
+        produced += len(day_events)
+        day = day.add(days=1)
+
+
+def build_store(path, count, groups, packed=False):
+    """Persist `count` events spread over `groups` groups in batches."""
+    for group in range(groups):
+        group_store = store.Store(store_path=path, group=f'group-{group}')
+        if packed:
+            group_store.pack()
+        group_store.persist_many(iter_events(count // groups,
+                                             seed=SEED + group))
+
+
+def timed(results, stage, func, *args, **kwargs):
+    begin = time.perf_counter()
+    result = func(*args, **kwargs)
+    results[stage] = time.perf_counter() - begin
+    return result
+
+
+def run(path, count, groups, packed=False):
+    results = {}
+    begin = time.perf_counter()
+    build_store(path, count, groups, packed)
+    results['build'] = time.perf_counter() - begin
+
+    def iter_all_names():
+        return [len(store.Store(store_path=path, group=group).iter_names())
+                for group in store.Store(store_path=path).groups]
+
+    timed(results, 'Store.iter_names all groups', iter_all_names)
+    group_store = store.Store(store_path=path, group='group-0')
+    timeline = timed(results, 'Store.iter_names', group_store.iter_names)
+    end = utils.from_epoch_micros(timeline.when(len(timeline) - 1))
+    situations = timed(
+        results, 'Sourcerer.generate', lambda: list(
+            sourcing.Sourcerer(group_store).generate(start=None, end=end)))
+
+    split = timed(results, 'aggregates.split_at_new_day',
+                  lambda: list(aggregates.split_at_new_day(situations)))
+    timed(results, 'aggregates.JoinedWorkDay',
+          lambda: list(aggregates.JoinedWorkDay.aggregate(split)))
+    summaries = timed(
+        results, 'aggregates.Summary',
+        lambda: list(aggregates.Summary.aggregate(situations)))
+    works = timed(results, 'aggregates.filter_no_breaks',
+                  lambda: list(aggregates.filter_no_breaks(summaries)))
+    changes = timed(results, 'aggregates.DatetimeChange',
+                    lambda: list(aggregates.DatetimeChange.aggregate(works)))
+    timed(results, 'aggregates.DatetimeStats',
+          lambda: list(aggregates.DatetimeStats.aggregate(changes)))
+
+    report = reporting.Report(
+        store.Store(store_path=path, group='group-0'), start=None, end=end)
+    timed(results, 'Report.render', report.render, template_name='console')
+    return {
+        'events': count,
+        'groups': groups,
+        'packed': packed,
+        'group_events': len(timeline),
+        'situations': len(situations),
+        'seconds': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-s', '--size', type=int, action='append',
+                        help='Total number of events, may be repeated.')
+    parser.add_argument('-g', '--groups', type=int, default=GROUPS)
+    parser.add_argument('-p', '--packed', action='store_true',
+                        help='Store the events in segments.')
+    parser.add_argument('-o', '--output', type=argparse.FileType('w'),
+                        default=sys.stdout)
+    args = parser.parse_args(argv)
+
+    runs = []
+    for count in args.size or SIZES:
+        with tempfile.TemporaryDirectory() as path:
+            result = run(pathlib.Path(path), count, args.groups,
+                         args.packed)
+            runs.append(result)
+            print(f'{count} events: ' + ', '.join(
+                f'{stage} {seconds:.3f}s'
+                for stage, seconds in result['seconds'].items()),
+                file=sys.stderr)
+
+    json.dump({
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': runs,
+    }, args.output, indent=2)
+    args.output.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Compare the sync and the async report rendering.
+
+The async path sources the situations in a thread while the template is
+rendered:
+
+    python benchmarks/report_async.py [<events>]
+"""
+import asyncio
+import pathlib
+import sys
+import tempfile
+import time
+
+import pipeline
+from zeitig import reporting, store, utils
+
+COUNT = 20000
+REPEAT = 3
+
+
+def report(path, end):
+    # a fresh store, so no events are cached in memory
+    return reporting.Report(store.Store(store_path=path, group='group-0'),
+                            start=None, end=end)
+
+
+def main(count=COUNT):
+    with tempfile.TemporaryDirectory() as path:
+        path = pathlib.Path(path)
+        pipeline.build_store(path, count, 1)
+        timeline = store.Store(store_path=path, group='group-0').iter_names()
+        end = utils.from_epoch_micros(timeline.when(len(timeline) - 1))
+
+        sync, async_ = [], []
+        for _ in range(REPEAT):
+            begin = time.perf_counter()
+            rendered = report(path, end).render(template_name='console')
+            sync.append(time.perf_counter() - begin)
+
+            loop = asyncio.new_event_loop()
+            begin = time.perf_counter()
+            rendered_async = loop.run_until_complete(
+                report(path, end).render_async(template_name='console'))
+            async_.append(time.perf_counter() - begin)
+            loop.close()
+            assert rendered == rendered_async
+
+        print(f'{count} events: render {min(sync):.3f}s'
+              f' render_async {min(async_):.3f}s'
+              f' speedup {min(sync) / min(async_):.2f}x')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,51 @@
+"""Measure memory and time to create and split situations.
+
+    python benchmarks/situations.py [<count>]
+"""
+import sys
+import time
+import tracemalloc
+
+import pendulum
+
+from zeitig import aggregates, events
+
+
+def create_situations(count):
+    start = pendulum.datetime(2018, 4, 1, 8, tz='UTC')
+    whens = [start.add(hours=i * 5) for i in range(count + 1)]
+    begin = time.perf_counter()
+    situations = []
+    for i in range(count):
+        cls = events.Work if i % 2 else events.Break
+        situations.append(cls(start=whens[i], end=whens[i + 1],
+                              tags=['foo']))
+    return situations, time.perf_counter() - begin
+
+
+def split(situations):
+    split = list(aggregates.split_at_new_day(situations))
+    for situation in split:
+        situation.local_period
+    return split
+
+
+def main(count=100000):
+    situations, created = create_situations(count)
+    begin = time.perf_counter()
+    split(situations)
+    elapsed = time.perf_counter() - begin
+
+    situations, _ = create_situations(count)
+    tracemalloc.start()
+    split_situations = split(situations)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{count} situations created in {created:.2f}s,'
+          f' {len(split_situations)} split in {elapsed:.2f}s,'
+          f' {size / len(split_situations):.0f} bytes per situation')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
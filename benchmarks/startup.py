@@ -0,0 +1,100 @@
+"""Assert the import time of the `z` subcommands.
+
+Every subcommand runs in fresh interpreters against a temporary store, once
+with `-X importtime` to find the imported modules.  The budgets apply to the
+time spent on top of importing the required dependencies, which depends on
+the machine:
+
+    python benchmarks/startup.py
+"""
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+# budgets in milliseconds to import and run a subcommand
+BUDGETS = {
+    ('work',): 50,
+    ('break',): 50,
+    ('add',): 50,
+    ('report',): 200,
+}
+# modules, which must not be imported by these subcommands
+FORBIDDEN = {
+    ('work',): ('jinja2', 'crayons', 'colorama', 'zeitig.reporting'),
+    ('break',): ('jinja2', 'crayons', 'colorama', 'zeitig.reporting'),
+    ('add',): ('jinja2', 'crayons', 'colorama', 'zeitig.reporting'),
+}
+RUN = '''
+import sys, time
+start = time.perf_counter()
+from zeitig import scripts
+sys.argv[0] = 'z'
+try:
+    scripts.run()
+except SystemExit:
+    pass
+print('elapsed', time.perf_counter() - start, file=sys.stderr)
+'''
+BASELINE = '''
+import sys, time
+start = time.perf_counter()
+import click, logging, pendulum, qtoml
+print('elapsed', time.perf_counter() - start, file=sys.stderr)
+'''
+RE_IMPORT_TIME = re.compile(r'import time:\s+\d+ \|\s+\d+ \|\s+(?P<module>\S+)')
+REPEAT = 5
+
+
+def elapsed(code, args=(), env=None):
+    """The minimal elapsed seconds reported by the code."""
+    times = []
+    for _ in range(REPEAT):
+        process = subprocess.run(
+            [sys.executable, '-c', code, 'bench', *args],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            universal_newlines=True, check=True)
+        times.append(float(process.stderr.split()[-1]))
+    return min(times)
+
+
+def run(store_path, args):
+    """Run a subcommand and return the elapsed seconds and imported modules.
+
+    The elapsed time is measured without `-X importtime`.
+    """
+    env = dict(os.environ, ZEITIG_STORE=store_path)
+    modules = set()
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', RUN, 'bench', *args],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    for line in process.stderr.splitlines():
+        match = RE_IMPORT_TIME.match(line)
+        if match:
+            modules.add(match.group('module'))
+    return elapsed(RUN, args, env), modules
+
+
+def main():
+    failed = False
+    baseline = elapsed(BASELINE) * 1000
+    print(f'dependencies: {baseline:.1f}ms')
+    with tempfile.TemporaryDirectory() as store_path:
+        for args, budget in BUDGETS.items():
+            total, modules = run(store_path, args)
+            total = total * 1000 - baseline
+            forbidden = [module for module in FORBIDDEN.get(args, ())
+                         if module in modules]
+            ok = total <= budget and not forbidden
+            failed = failed or not ok
+            print(f'z {" ".join(args)}: +{total:.1f}ms of {budget}ms'
+                  f' {len(modules)} modules'
+                  f'{" imports " + ", ".join(forbidden) if forbidden else ""}'
+                  f' {"ok" if ok else "FAILED"}')
+    assert not failed, 'Startup is too slow'
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,8 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import collections
+
 import pendulum
 
 from zeitig import events, utils
@@ -53,16 +55,34 @@ class Summary:
 
 class JoinedWorkDay(events.Situation):
     """Creates a new Situation for a whole day."""
-    def __init__(self, date, *, tags=None, duration=None):
+
+    __slots__ = ('date', 'duration')
+
+    def __init__(self, date, *, tags=None, duration=None, tz=None):
         self.date = date
         super().__init__(
             start=date.start_of('day'),
             end=(date + pendulum.duration(days=1)).start_of('day'),
-            tags=tags
+            tags=tags,
+            tz=tz
         )
         self.duration = (duration if duration is not None
                          else pendulum.duration())
 
+    @classmethod
+    def from_rollup(cls, day_rollup, tz):
+        """Create the day of a `rollups.DayRollup`.
+
+        The day is the last one, if a situation of it is still open.
+        """
+        date = day_rollup.date
+        day = cls(pendulum.datetime(date.year, date.month, date.day, tz=tz),
+                  tags=list(day_rollup.tags), duration=day_rollup.works,
+                  tz=tz)
+        day.notes.extend(day_rollup.notes)
+        day.is_last = day_rollup.last is None
+        return day
+
     def __eq__(self, other):
         return (
             self.start == other.start
@@ -111,10 +131,44 @@ class JoinedWorkDay(events.Situation):
                 f' [{self.start}, {self.end}) {self.duration}>')
 
 
+class CalendarKey(collections.namedtuple('CalendarKey',
+                                         'day week month year')):
+
+    """Integer ordinals of the local day, week, month and year of a date.
+
+    The week is counted from mondays.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_date(cls, date):
+        day = date.toordinal()
+        # the ordinal 1 is a monday
+        return cls(day, (day - 1) // 7, date.year * 12 + date.month - 1,
+                   date.year)
+
+    @classmethod
+    def from_situation(cls, situation):
+        """The key of the local start of a situation or `None`."""
+        if situation is None:
+            return None
+        date = situation.local_start_date
+        return cls.from_date(date) if date is not None else None
+
+
 class DatetimeChange:
-    def __init__(self, last_event, event):
+    def __init__(self, last_event, event, *, before_key=False, now_key=False):
+        """
+        :param before_key: the `CalendarKey` of the last event, if known.
+        :param now_key: the `CalendarKey` of the event, if known.
+        """
         self.last_event = last_event
         self.event = event
+        if before_key is not False:
+            self.before_key = before_key
+        if now_key is not False:
+            self.now_key = now_key
 
     def __repr__(self):
         return f'<{self.__class__.__name__}: {self.before} - {self.now}>'
@@ -127,43 +181,37 @@ class DatetimeChange:
     def now(self):
         return self.event.local_start
 
+    @utils.reify
+    def before_key(self):
+        return CalendarKey.from_situation(self.last_event)
+
+    @utils.reify
+    def now_key(self):
+        return CalendarKey.from_situation(self.event)
+
     @utils.reify
     def is_new_day(self):
-        if not self.before:
+        if not self.before_key:
             return True
-        last_day = self.before.start_of('day')
-        current_day = self.now.start_of('day')
-        return (current_day - last_day).in_days()
+        return self.now_key.day - self.before_key.day
 
     @utils.reify
     def is_new_week(self):
-        if not self.before:
+        if not self.before_key:
             return True
-        last_week = self.before.start_of('week')
-        current_week = self.now.start_of('week')
-        return (current_week - last_week).in_weeks()
+        return self.now_key.week - self.before_key.week
 
     @utils.reify
     def is_new_month(self):
-        if not self.before:
+        if not self.before_key:
             return True
-        # as long as deprecated start_of_month
-        last_month = self.before.replace(day=1, hour=0, minute=0, second=0,
-                                         microsecond=0)
-        current_month = self.now.replace(day=1, hour=0, minute=0, second=0,
-                                         microsecond=0)
-        return (current_month - last_month).in_months()
+        return self.now_key.month - self.before_key.month
 
     @utils.reify
     def is_new_year(self):
-        if not self.before:
+        if not self.before_key:
             return True
-        # as long as deprecated start_of_year
-        last_year = self.before.replace(month=1, day=1, hour=0, minute=0,
-                                        second=0, microsecond=0)
-        current_year = self.now.replace(month=1, day=1, hour=0, minute=0,
-                                        second=0, microsecond=0)
-        return (current_year - last_year).in_years()
+        return self.now_key.year - self.before_key.year
 
     @utils.reify
     def has_changed(self):
@@ -172,13 +220,15 @@ class DatetimeChange:
 
     @classmethod
     def aggregate(cls, iter_events):
-        last_event = None
+        last_event = last_key = None
         for event in iter_events:
             if isinstance(event, events.Situation):
-                dt_change = cls(last_event, event)
+                key = CalendarKey.from_situation(event)
+                dt_change = cls(last_event, event, before_key=last_key,
+                                now_key=key)
                 if dt_change.has_changed:
                     yield dt_change
-                last_event = event
+                last_event, last_key = event, key
             yield event
 
 
@@ -190,7 +240,10 @@ class DatetimeStats:
     def apply_event(self, event):
         if isinstance(event, DatetimeChange):
             if event.is_new_day and isinstance(event.event, events.Work):
-                self.working_days.append(event.event.local_start.date())
+                date = event.event.local_start_date
+                # templates get pendulum dates like before
+                self.working_days.append(
+                    pendulum.Date(date.year, date.month, date.day))
 
         if isinstance(event, Summary):
             self.summary = event
@@ -0,0 +1,132 @@
+# Copyright 2018 Oliver Berger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A persistent cache of decoded event sources.
+
+Event sources are effectively immutable after they were persisted, so we keep
+their decoded data in a `marshal` file and skip the TOML parsing, as long as
+the file or segment record still has the same modification time and size.
+A rewritten event fails that validation, so there is no need to invalidate
+anything on persist. Entries of removed events are dropped, when the cache is
+written. Sources with values `marshal` does not know, like TOML dates and
+local times, are not cached.
+"""
+import datetime
+import logging
+import marshal
+import os
+
+log = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def encode_source(source):
+    """Split datetimes off the source, since marshal does not know them.
+
+    :raises ValueError: if the source has values, which can not be cached.
+    """
+    values, datetimes = {}, {}
+    for name, value in source.items():
+        if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+            delta = value - EPOCH
+            datetimes[name] = (delta.days * 86400 + delta.seconds) * 1000000\
+                + delta.microseconds
+        else:
+            values[name] = value
+    # fails for nested or other date and time values
+    marshal.dumps(values)
+    return values, datetimes
+
+
+def decode_source(values, datetimes):
+    source = dict(values)
+    for name, micros in datetimes.items():
+        source[name] = EPOCH + datetime.timedelta(microseconds=micros)
+    return source
+
+
+class EventSourceCache:
+
+    """Decoded event sources of a group validated by their origin."""
+
+    def __init__(self, path):
+        self.path = path
+        self.dirty = False
+        self._entries = None
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.path}>'
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            self._entries = {}
+            if self.path.is_file():
+                try:
+                    with self.path.open('rb') as cache_file:
+                        version, entries = marshal.load(cache_file)
+                except (EOFError, ValueError, TypeError):
+                    log.warning('Ignoring broken event cache: %s', self.path)
+                else:
+                    if version == CACHE_VERSION:
+                        self._entries = entries
+        return self._entries
+
+    def get(self, name, validator):
+        """Return the source, if it is still valid."""
+        try:
+            cached_validator, values, datetimes = self.entries[name]
+        except KeyError:
+            return None
+        if cached_validator != validator:
+            return None
+        return decode_source(values, datetimes)
+
+    def set(self, name, validator, source):
+        try:
+            entry = (validator,) + encode_source(source)
+        except ValueError:
+            log.debug('Not caching event source: %s', name)
+            self.entries.pop(name, None)
+            return
+        self.entries[name] = entry
+        self.dirty = True
+
+    def prune(self, names):
+        """Drop the entries of all events, which are not in `names`."""
+        if self._entries is None:
+            return
+        names = set(names)
+        stale = [name for name in self._entries if name not in names]
+        for name in stale:
+            del self._entries[name]
+        if stale:
+            self.dirty = True
+
+    def dump(self, names=None):
+        """Write the cache, if something has changed.
+
+        :param names: the names of all existing events, the entries of other
+            events are dropped before.
+        """
+        if names is not None:
+            self.prune(names)
+        if not self.dirty:
+            return
+        tmp_path = self.path.with_name(f'.{self.path.name}.tmp')
+        with tmp_path.open('wb') as cache_file:
+            marshal.dump((CACHE_VERSION, self.entries), cache_file)
+        os.replace(str(tmp_path), str(self.path))
+        self.dirty = False
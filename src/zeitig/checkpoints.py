@@ -0,0 +1,123 @@
+# Copyright 2018 Oliver Berger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Persisted checkpoints of the open situation.
+
+A checkpoint holds the state of the situation right after the event it is
+keyed by, so sourcing may start there instead of replaying all events back to
+the last situation change.
+"""
+import logging
+import os
+
+import qtoml
+
+from . import events
+
+log = logging.getLogger(__name__)
+
+# a checkpoint is stored if we had to replay at least this number of events
+CHECKPOINT_INTERVAL = 50
+
+SITUATIONS = {
+    'work': events.Work,
+    'break': events.Break,
+}
+
+
+def dump_situation(situation):
+    """The state of a situation as plain data."""
+    data = {
+        'type': situation.__class__.__name__.lower(),
+        'tags': list(situation.tags),
+        'notes': list(situation.notes),
+    }
+    if situation.start is not None:
+        data['start'] = str(situation.start)
+    return data
+
+
+def load_situation(data, round=None):
+    """Create a situation from its state."""
+    start = data.get('start')
+    situation = SITUATIONS[data['type']](
+        start=events.validate_when(start) if start is not None else None,
+        tags=list(data['tags']),
+        round=round,
+    )
+    situation.notes = list(data['notes'])
+    return situation
+
+
+class Checkpoints:
+
+    """The checkpoints of a group.
+
+    :param path: the file to persist the checkpoints in or `None` to keep them
+        in memory only.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._checkpoints = None
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.path}>'
+
+    @property
+    def checkpoints(self):
+        if self._checkpoints is None:
+            self._checkpoints = {}
+            if self.path is not None and self.path.is_file():
+                with self.path.open('r') as checkpoints_file:
+                    self._checkpoints.update(
+                        qtoml.load(checkpoints_file).get('checkpoints', {}))
+        return self._checkpoints
+
+    def dump(self):
+        if self.path is None:
+            return
+        tmp_path = self.path.with_name(f'.{self.path.name}.tmp')
+        with tmp_path.open('w') as checkpoints_file:
+            qtoml.dump({'checkpoints': self.checkpoints}, checkpoints_file)
+        os.replace(str(tmp_path), str(self.path))
+
+    def __contains__(self, name):
+        return name in self.checkpoints
+
+    def get(self, name, round=None):
+        """Create the situation of the checkpoint after this event."""
+        try:
+            checkpoint = self.checkpoints[name]
+        except KeyError:
+            return None
+        return load_situation(checkpoint, round=round)
+
+    def set(self, name, situation):
+        """Store the state of the situation after this event."""
+        self.checkpoints[name] = dump_situation(situation)
+        self.dump()
+        log.info('Stored checkpoint after %s', name)
+
+    def invalidate(self, name):
+        """Drop all checkpoints, which may be affected by this event."""
+        invalid = [key for key in self.checkpoints if key >= name]
+        if invalid:
+            for key in invalid:
+                del self.checkpoints[key]
+            self.dump()
+
+    def clear(self):
+        if self.checkpoints:
+            self.checkpoints.clear()
+            self.dump()
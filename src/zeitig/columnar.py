@@ -0,0 +1,259 @@
+# Copyright 2018 Oliver Berger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A vectorized aggregation engine.
+
+Situations are loaded into columns of UTC epoch microseconds and all totals
+are computed by `numpy`, which has to be installed separately::
+
+    pip install zeitig[columnar]
+
+The results match those of the generator aggregators:
+
+    - `Engine.days` the `JoinedWorkDay` durations of a stream split by
+      `split_at_new_day`
+
+    - `Engine.summary` the `Summary` of the stream
+
+    - `Engine.working_days` and `Engine.hours_per_working_day` the
+      `DatetimeStats` of a stream without breaks
+"""
+import collections
+
+import pendulum
+
+from . import events, timezones, utils
+
+try:
+    import numpy
+except ImportError:     # pragma: no cover
+    numpy = None
+
+DAY = events.DAY_MICROS
+MICROS = events.MICROS
+WORK, BREAK = 1, 0
+
+
+class EngineNotAvailable(Exception):
+    pass
+
+
+def _check_numpy():
+    if numpy is None:
+        raise EngineNotAvailable(
+            'The columnar engine needs numpy: pip install zeitig[columnar]')
+
+
+Summary = collections.namedtuple('Summary', 'start end works breaks')
+Totals = collections.namedtuple('Totals', 'dates works breaks')
+
+
+class Columns:
+
+    """Situations as columns of UTC epoch microseconds."""
+
+    def __init__(self, start, end, kind, group, groups=None):
+        _check_numpy()
+        self.start = numpy.asarray(start, dtype='int64')
+        self.end = numpy.asarray(end, dtype='int64')
+        self.kind = numpy.asarray(kind, dtype='int8')
+        self.group = numpy.asarray(group, dtype='int32')
+        self.groups = groups if groups is not None else [None]
+
+    def __len__(self):
+        return len(self.start)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {len(self)} situations>'
+
+    @classmethod
+    def from_situations(cls, situations, group=None):
+        """Load all `Work`s and `Break`s with a start and an end."""
+        start, end, kind = [], [], []
+        for situation in situations:
+            if not isinstance(situation, (events.Work, events.Break)):
+                continue
+            if situation.start is None or situation.end is None:
+                continue
+            start.append(utils.epoch_micros(situation.start))
+            end.append(utils.epoch_micros(situation.end))
+            kind.append(WORK if isinstance(situation, events.Work)
+                        else BREAK)
+        return cls(start, end, kind, [0] * len(start), groups=[group])
+
+    @classmethod
+    def from_groups(cls, situations_by_group):
+        """Load the situations of several groups keyed by the group name."""
+        columns = [cls.from_situations(situations, group=group)
+                   for group, situations in situations_by_group.items()]
+        return cls(
+            numpy.concatenate([c.start for c in columns] or [[]]),
+            numpy.concatenate([c.end for c in columns] or [[]]),
+            numpy.concatenate([c.kind for c in columns] or [[]]),
+            numpy.concatenate([numpy.full(len(c), i, dtype='int32')
+                               for i, c in enumerate(columns)] or [[]]),
+            groups=[c.groups[0] for c in columns],
+        )
+
+    def select(self, group=0):
+        """The columns of a single group."""
+        mask = self.group == group
+        return self.__class__(
+            self.start[mask], self.end[mask], self.kind[mask],
+            self.group[mask], groups=self.groups)
+
+
+class Engine:
+
+    """Compute work and break totals for columns of situations.
+
+    :param columns: the situations of a single group.
+    :param tz: the local timezone.
+    :param round: an `events.Round` as used for the situations.
+    """
+
+    def __init__(self, columns, *, tz=None, round=None):
+        self.columns = columns
+        self.tz = tz if tz is not None else events.get_local_timezone()
+        self.round = round
+
+    @utils.reify
+    def transitions(self):
+        columns = self.columns
+        if not len(columns):
+            return numpy.zeros(1, dtype='int64'), numpy.zeros(1, dtype='int64')
+        times, offsets = timezones.get_table(self.tz).span(
+            int(columns.start.min()), int(columns.end.max()))
+        return numpy.array(times, dtype='int64'),\
+            numpy.array(offsets, dtype='int64')
+
+    def local(self, micros):
+        """Convert UTC epoch microseconds into local wall clock ones."""
+        times, offsets = self.transitions
+        positions = numpy.searchsorted(times, micros, side='right') - 1
+        return micros + offsets[numpy.maximum(positions, 0)]
+
+    @utils.reify
+    def rounded(self):
+        """The start and end of every situation aligned to the round."""
+        columns = self.columns
+        if not self.round:
+            return columns.start, columns.end
+        local_start = self.local(columns.start)
+        local_end = self.local(columns.end)
+        start, end = self.round.round_bounds(
+            local_start, local_end, columns.kind == WORK)
+        # the offset is kept
+        return columns.start + (start - local_start),\
+            columns.end + (end - local_end)
+
+    @utils.reify
+    def summary(self):
+        columns = self.columns
+        start, end = self.rounded
+        works = numpy.flatnonzero(columns.kind == WORK)
+        if not len(works):
+            return Summary(None, None, pendulum.duration(),
+                           pendulum.duration())
+        first, last = works[0], works[-1]
+        breaks = numpy.flatnonzero(columns.kind[first:last] == BREAK) + first
+        return Summary(
+            utils.from_epoch_micros(int(columns.start[first])),
+            utils.from_epoch_micros(int(columns.end[last])),
+            pendulum.duration(microseconds=int(
+                (end[works] - start[works]).sum())),
+            pendulum.duration(microseconds=int(
+                (end[breaks] - start[breaks]).sum())),
+        )
+
+    @utils.reify
+    def working_days(self):
+        """The local dates of new working days."""
+        columns = self.columns
+        start, _ = self.rounded
+        days = self.local(start[columns.kind == WORK]) // DAY
+        new_days = numpy.ones(len(days), dtype=bool)
+        new_days[1:] = days[1:] != days[:-1]
+        return days[new_days].astype('datetime64[D]')
+
+    @property
+    def hours_per_working_day(self):
+        if not len(self.working_days):
+            return 0.0
+        return self.summary.works.total_hours() / len(self.working_days)
+
+    def _integrate(self, kind, times):
+        """The total duration of a kind of situation up to each time."""
+        start, end = self.rounded
+        mask = self.columns.kind == kind
+        start, end = start[mask], end[mask]
+        durations = numpy.concatenate(([0], numpy.cumsum(end - start)))
+        starts = numpy.concatenate(([0], numpy.cumsum(start)))
+        # situations completed before and started before
+        completed = numpy.searchsorted(end, times, side='right')
+        started = numpy.searchsorted(start, times, side='left')
+        running = started - completed
+        return durations[completed]\
+            + running * times - (starts[started] - starts[completed])
+
+    @utils.reify
+    def midnights(self):
+        """The local dates of all days and the UTC times of their starts."""
+        start, end = self.rounded
+        if not len(start):
+            return numpy.array([], dtype='datetime64[D]'),\
+                numpy.array([], dtype='int64')
+        first = self.local(start).min() // DAY
+        last = self.local(end).max() // DAY
+        dates = numpy.arange(first, last + 1).astype('datetime64[D]')
+        table = timezones.get_table(self.tz)
+        times = [table.midnight(day)
+                 for day in range(int(first), int(last) + 2)]
+        return dates, numpy.array(times, dtype='int64')
+
+    @utils.reify
+    def days(self):
+        """The work and break seconds of every local day."""
+        dates, times = self.midnights
+        if not len(dates):
+            return Totals(dates, numpy.array([]), numpy.array([]))
+        works = numpy.diff(self._integrate(WORK, times)) / MICROS
+        breaks = numpy.diff(self._integrate(BREAK, times)) / MICROS
+        return Totals(dates, works, breaks)
+
+    def _reduce(self, keys, dates):
+        days = self.days
+        if not len(keys):
+            return days
+        positions = numpy.flatnonzero(
+            numpy.concatenate(([True], keys[1:] != keys[:-1])))
+        return Totals(
+            dates[positions],
+            numpy.add.reduceat(days.works, positions),
+            numpy.add.reduceat(days.breaks, positions),
+        )
+
+    @utils.reify
+    def weeks(self):
+        """The totals of every week by its monday."""
+        dates = self.days.dates
+        # 1970-01-01 was a thursday
+        keys = (dates.astype('int64') + 3) // 7
+        return self._reduce(keys, (keys * 7 - 3).astype('datetime64[D]'))
+
+    @utils.reify
+    def months(self):
+        """The totals of every month by its first day."""
+        months = self.days.dates.astype('datetime64[M]')
+        return self._reduce(months.astype('int64'),
+                            months.astype('datetime64[D]'))
@@ -13,15 +13,32 @@
 # limitations under the License.
 import collections
 import datetime
+import functools
 import re
 import sys
 
 import pendulum
 
-from . import utils
+from . import timezones, utils
 
 PY_37 = sys.version_info >= (3, 7)
-local_timezone = pendulum.local_timezone()
+MICROS = 1000000
+DAY_MICROS = 86400 * MICROS
+
+
+@functools.lru_cache(maxsize=None)
+def get_local_timezone():
+    return pendulum.local_timezone()
+
+
+if PY_37:
+    def __getattr__(name):
+        # the local timezone is looked up on first use only
+        if name == 'local_timezone':
+            return get_local_timezone()
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+else:
+    local_timezone = get_local_timezone()
 
 if PY_37:
     PATTERN_TYPE = re.Pattern
@@ -39,77 +56,257 @@ class Round:
     def __repr__(self):
         return f'<{self.__class__.__name__}: {self.size} seconds>'
 
-    @staticmethod
-    def _total_seconds(datetime):
-        duration = pendulum.Duration(
-            hours=datetime.hour,
-            minutes=datetime.minute,
-            seconds=datetime.second,
-            microseconds=datetime.microsecond
+    @property
+    def micros(self):
+        return int(self.size * MICROS)
+
+    def round_micros(self, local_micros, up=False):
+        """Round local wall clock microseconds to the start or end of a block.
+
+        Blocks ending at midnight end at the start of that day, like
+        `block`.
+
+        :param local_micros: local epoch microseconds or microseconds of a
+            day as `int` or `numpy` array.
+        :param up: round to the end of the block.
+        """
+        size = self.micros
+        time_of_day = local_micros % DAY_MICROS
+        blocks = time_of_day // size
+        if up:
+            blocks = blocks + (time_of_day % size > 0)
+        return local_micros - time_of_day + blocks * size % DAY_MICROS
+
+    def round_bounds(self, starts, ends, works):
+        """Round the local bounds of many situations at once.
+
+        Works are aligned to the start of their first and the end of their
+        last block, breaks the other way round, like `Work` and `Break` do.
+
+        :param starts: local wall clock epoch microseconds of the starts.
+        :param ends: local wall clock epoch microseconds of the ends.
+        :param works: if the situations are works.
+        :returns: the rounded starts and ends as lists or as `numpy` arrays,
+            if `numpy` arrays were given.
+        """
+        if hasattr(starts, 'dtype'):
+            works = works.astype(starts.dtype)
+            floors, ceils = (self.round_micros(starts),
+                             self.round_micros(starts, up=True))
+            starts = ceils + works * (floors - ceils)
+            floors, ceils = (self.round_micros(ends),
+                             self.round_micros(ends, up=True))
+            ends = floors + works * (ceils - floors)
+            return starts, ends
+        return (
+            [self.round_micros(start, up=not work)
+             for start, work in zip(starts, works)],
+            [self.round_micros(end, up=work)
+             for end, work in zip(ends, works)],
         )
-        return duration.total_seconds()
+
+    @staticmethod
+    def _time_of_day(datetime):
+        return ((datetime.hour * 60 + datetime.minute) * 60
+                + datetime.second) * MICROS + datetime.microsecond
+
+    @staticmethod
+    def _set_time_of_day(datetime, micros):
+        # like `DateTime.set`, so non existing times are shifted alike
+        seconds = micros // MICROS
+        return pendulum.datetime(
+            datetime.year, datetime.month, datetime.day,
+            seconds // 3600, seconds // 60 % 60, seconds % 60,
+            tz=datetime.tz)
+
+    def floor(self, datetime):
+        """Return the start of that round."""
+        return self._set_time_of_day(
+            datetime, self.round_micros(self._time_of_day(datetime)))
+
+    def ceil(self, datetime):
+        """Return the end of that round."""
+        return self._set_time_of_day(
+            datetime, self.round_micros(self._time_of_day(datetime), up=True))
 
     def block(self, datetime):
         """Return the start and end of that round.
 
         We consider datetme as local tz
         """
-        total_seconds = self._total_seconds(datetime)
-        blocks, rest = divmod(total_seconds, self.size)
-        start_duration = pendulum.Duration(seconds=blocks * self.size)
-        end_duration = pendulum.Duration(seconds=(
-            blocks + (1 if rest else 0)) * self.size)
-
-        start = datetime.set(
-            hour=start_duration.hours,
-            minute=start_duration.minutes,
-            second=start_duration.remaining_seconds,
-            microsecond=0,
-        )
-        end = datetime.set(
-            hour=end_duration.hours,
-            minute=end_duration.minutes,
-            second=end_duration.remaining_seconds,
-            microsecond=0,
-        )
-        return start, end
+        return self.floor(datetime), self.ceil(datetime)
 
 
 class Interval:
-    def __init__(self, *, start=None, end=None, round=None):
-        self.start = start
-        self.end = end
-        self.round = round
 
-    @utils.reify
+    """A compact interval between two UTC epoch microseconds.
+
+    Start and end are converted into UTC epoch microseconds on first use and
+    `DateTime`s are only created on demand. The local ones and the periods
+    are kept until the interval changes.
+    """
+
+    __slots__ = ('_start_value', '_end_value', '_round', '_tz',
+                 '_local_start', '_local_end', '_local_period', '_period')
+    _CACHED_ATTRS = ('_local_start', '_local_end', '_local_period', '_period')
+
+    def __init__(self, *, start=None, end=None, round=None, tz=None):
+        # a datetime or UTC epoch microseconds
+        self._start_value = start
+        self._end_value = end
+        self._round = round
+        # the timezone for local times
+        self._tz = tz if tz is not None else get_local_timezone()
+        self._local_start = self._local_end = None
+        self._local_period = self._period = None
+
+    def _reset(self):
+        """Drop all cached values."""
+        self._local_start = self._local_end = None
+        self._local_period = self._period = None
+
+    def __getstate__(self):
+        return {name: getattr(self, name)
+                for cls in self.__class__.__mro__
+                for name in cls.__dict__.get('__slots__', ())
+                if name not in self._CACHED_ATTRS and hasattr(self, name)}
+
+    def __setstate__(self, state):
+        self._reset()
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    @property
+    def _start(self):
+        """The UTC epoch microseconds of the start."""
+        start = self._start_value
+        if start is not None and start.__class__ is not int:
+            start = self._start_value = utils.epoch_micros(start)
+        return start
+
+    @_start.setter
+    def _start(self, start):
+        self._start_value = start
+        self._reset()
+
+    @property
+    def _end(self):
+        """The UTC epoch microseconds of the end."""
+        end = self._end_value
+        if end is not None and end.__class__ is not int:
+            end = self._end_value = utils.epoch_micros(end)
+        return end
+
+    @_end.setter
+    def _end(self, end):
+        self._end_value = end
+        self._reset()
+
+    @property
+    def start(self):
+        start = self._start
+        return utils.from_epoch_micros(start) if start is not None else None
+
+    @start.setter
+    def start(self, start):
+        self._start_value = start
+        self._reset()
+
+    @property
+    def end(self):
+        end = self._end
+        return utils.from_epoch_micros(end) if end is not None else None
+
+    @end.setter
+    def end(self, end):
+        self._end_value = end
+        self._reset()
+
+    @property
+    def round(self):
+        return self._round
+
+    @round.setter
+    def round(self, round):
+        self._round = round
+        self._reset()
+
+    @property
+    def tz(self):
+        return self._tz
+
+    @tz.setter
+    def tz(self, tz):
+        self._tz = tz
+        self._reset()
+
+    @property
+    def table(self):
+        """The offsets of the local timezone."""
+        return timezones.get_table(self.tz)
+
+    def _local_start_micros(self):
+        """The UTC epoch microseconds of the local start."""
+        return self._start
+
+    def _local_end_micros(self):
+        """The UTC epoch microseconds of the local end."""
+        return self._end
+
+    def _round_micros(self, micros, up=False):
+        """Align UTC epoch microseconds to the local round."""
+        if not self.round or micros is None:
+            return micros
+        table = self.table
+        return table.utc(self.round.round_micros(table.local(micros), up=up))
+
+    @property
     def local_start(self):
-        return self.start.in_tz(local_timezone) if self.start else None
+        if self._local_start is None:
+            micros = self._local_start_micros()
+            if micros is not None:
+                self._local_start = self.table.local_datetime(micros)
+        return self._local_start
 
-    @utils.reify
+    @property
     def local_end(self):
-        return self.end.in_tz(local_timezone) if self.end else None
+        if self._local_end is None:
+            micros = self._local_end_micros()
+            if micros is not None:
+                self._local_end = self.table.local_datetime(micros)
+        return self._local_end
+
+    @property
+    def local_start_date(self):
+        """The local date of the start without creating a `DateTime`."""
+        micros = self._local_start_micros()
+        return self.table.date(micros) if micros is not None else None
 
-    @utils.reify
+    @property
     def local_period(self):
-        if self.local_start is not None and self.local_end is not None:
-            local_period = self.local_end - self.local_start
-            return local_period
-        return None
+        if self._local_period is None:
+            local_start, local_end = self.local_start, self.local_end
+            if local_start is not None and local_end is not None:
+                self._local_period = local_end - local_start
+        return self._local_period
 
-    @utils.reify
+    @property
     def period(self):
-        if self.start is not None and self.end is not None:
-            period = self.end - self.start
-            return period
-        return None
+        if self._period is None and self._start_value is not None\
+                and self._end_value is not None:
+            self._period = self.end - self.start
+        return self._period
 
-    @utils.reify
+    @property
     def is_local_overnight(self):
-        if self.local_start:
-            # either end or local now
-            end = self.local_end or utils.utcnow()
-            period = end.date() - self.local_start.date()
-            return period.total_days() > 0
+        start = self._local_start_micros()
+        if start is not None:
+            # either end or now
+            end = self._local_end_micros()
+            if end is None:
+                end = utils.epoch_micros(utils.utcnow())
+            table = self.table
+            return table.day(end) > table.day(start)
         # return None if no start is given
         return None
 
@@ -119,41 +316,50 @@ class Interval:
 
 
 class Situation(Interval):
-    def __init__(self, *args, tags=None, note=None, **kwargs):
-        super().__init__(*args, **kwargs)
+
+    __slots__ = ('tags', 'notes', 'is_last', 'group')
+
+    def __init__(self, *, start=None, end=None, round=None, tz=None,
+                 tags=None, note=None):
+        Interval.__init__(self, start=start, end=end, round=round, tz=tz)
         self.tags = tags if tags is not None else []
         self.notes = [note] if note is not None else []
         # seem a bit hacky
         # `is_last` tags a situation for reporting
         self.is_last = False
+        # the group is only set for reports of several groups
+        self.group = None
 
     def split_local_overnight(self):
         """Split the situation at local day changes."""
         if self.is_local_overnight:
-            next_start = self.local_start
-            next_end = next_start.add(days=1).start_of('day')
-            while next_end < self.local_end:
-                situation = self.__class__(
-                    start=next_start.in_tz('UTC'),
-                    end=next_end.in_tz('UTC'))
-                situation.tags = self.tags
-                situation.notes = self.notes
-                yield situation
-
-                next_start = next_end
-                next_end = next_start.add(days=1).start_of('day')
+            start = self._local_start_micros()
+            end = self._local_end_micros()
+            if end is None:
+                end = utils.epoch_micros(utils.utcnow())
+            table = self.table
+            day = table.day(start)
+            next_end = table.midnight(day + 1)
+            while next_end < end:
+                yield self._split(start, next_end)
+                start = next_end
+                day += 1
+                next_end = table.midnight(day + 1)
 
             # finish end
-            situation = self.__class__(
-                start=next_start.in_tz('UTC'),
-                end=self.local_end.in_tz('UTC'))
-            situation.tags = self.tags
-            situation.notes = self.notes
-            yield situation
+            yield self._split(start, end)
         else:
             # do not split otherwise
             yield self
 
+    def _split(self, start, end):
+        situation = self.__class__(tz=self.tz)
+        situation._start_value, situation._end_value = start, end
+        situation.tags = self.tags
+        situation.notes = self.notes
+        situation.group = self.group
+        return situation
+
     def __repr__(self):
         return (f'<{self.__class__.__name__}'
                 f' [{self.start}, {self.end}) {self.period.as_interval()}'
@@ -161,39 +367,29 @@ class Situation(Interval):
 
 
 class Work(Situation):
-    @utils.reify
-    def local_start(self):
+
+    __slots__ = ()
+
+    def _local_start_micros(self):
         """Align the start to the beginning of the round."""
-        start = super().local_start
-        if self.round:
-            start, _ = self.round.block(start)
-        return start
+        return self._round_micros(self._start)
 
-    @utils.reify
-    def local_end(self):
+    def _local_end_micros(self):
         """Align the end to the end of the round."""
-        end = super().local_end
-        if self.round:
-            _, end = self.round.block(end)
-        return end
+        return self._round_micros(self._end, up=True)
 
 
 class Break(Situation):
-    @utils.reify
-    def local_start(self):
+
+    __slots__ = ()
+
+    def _local_start_micros(self):
         """Align the start to the end of the round."""
-        start = super().local_start
-        if self.round:
-            _, start = self.round.block(start)
-        return start
+        return self._round_micros(self._start, up=True)
 
-    @utils.reify
-    def local_end(self):
+    def _local_end_micros(self):
         """Align the end to the beginning of the round."""
-        end = super().local_end
-        if self.round:
-            end, _ = self.round.block(end)
-        return end
+        return self._round_micros(self._end)
 
 
 class NoDefault:
@@ -204,6 +400,10 @@ class NoDefault:
     """
 
 
+# the instance attribute holding the deserialized parameter values
+DECODED_NAME = '__decoded__'
+
+
 class Parameter:
 
     """Define an `Event` parameter."""
@@ -221,11 +421,6 @@ class Parameter:
             return self
         try:
             value = instance.__dict__[self.__name__]
-            # we explicitelly keep original data
-            if callable(self.deserialize):
-                value = self.deserialize(value)
-            return value
-
         except KeyError:
             if self.default is NoDefault:
                 raise AttributeError(
@@ -237,11 +432,22 @@ class Parameter:
                 if callable(self.default) else self.default
             return default
 
+        # we explicitelly keep original data
+        # and remember the deserialized value besides
+        if callable(self.deserialize):
+            decoded = instance.__dict__.setdefault(DECODED_NAME, {})
+            try:
+                value = decoded[self.__name__]
+            except KeyError:
+                value = decoded[self.__name__] = self.deserialize(value)
+        return value
+
     def __set__(self, instance, value):
         # just store the value
         if callable(self.serialize):
             value = self.serialize(value)
         instance.__dict__[self.__name__] = value
+        instance.__dict__.get(DECODED_NAME, {}).pop(self.__name__, None)
 
     def __set_name__(self, owner, name):
         self.__name__ = name
@@ -289,12 +495,18 @@ class _EventMeta(type):
 
 def validate_when(value):
     """Used to convert between pendulum and other types of datetime."""
-    if isinstance(value, datetime.datetime):
-        value = pendulum.from_timestamp(value.timestamp(), tz='UTC')
-    elif not isinstance(value, pendulum.DateTime):
-        value = pendulum.parse(value)
-
-    value = value.in_tz('UTC')
+    if isinstance(value, pendulum.DateTime):
+        if value.timezone_name != 'UTC':
+            value = value.in_tz('UTC')
+    elif isinstance(value, datetime.datetime):
+        value = value.astimezone(datetime.timezone.utc)
+        value = pendulum.DateTime(
+            value.year, value.month, value.day,
+            value.hour, value.minute, value.second, value.microsecond,
+            tzinfo=pendulum.UTC,
+        )
+    else:
+        value = utils.parse_utc(value)
 
     return value
 
@@ -356,8 +568,8 @@ class Event(metaclass=_EventMeta):
 
     @property
     def local_when(self):
-        when = self.when.in_tz(pendulum.local_timezone())
-        return when
+        return timezones.get_table(get_local_timezone()).local_datetime(
+            utils.epoch_micros(self.when))
 
 
 class SituationEvent:
@@ -370,7 +582,8 @@ class SituationEvent:
         """Create a situation."""
         situation = self.__situation__(
             start=self.when,
-            tags=self.tags,
+            # situations change their tags, so we do not share them
+            tags=list(self.tags),
             note=self.note,
             round=round,
         )
@@ -450,7 +663,8 @@ class RemoveEvent(Event, ActionEvent):
         except AttributeError:
             pass
         else:
-            # flush old notes if we set a new via remove
-            left_notes = [note for note in situation.notes
-                          if not re_note.match(note)]
-            situation.notes = left_notes
+            if re_note is not None:
+                # flush old notes if we set a new via remove
+                left_notes = [note for note in situation.notes
+                              if not re_note.match(note)]
+                situation.notes = left_notes
@@ -0,0 +1,160 @@
+# Copyright 2018 Oliver Berger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Write events or situations as JSON lines or CSV.
+
+Every row is written as soon as it is sourced, so an export of any size is
+streamed to a pipe without a template. Exported events have the fields of
+`importing`, so they may be imported again::
+
+    {"type": "work", "when": "2018-04-01T06:00:00+00:00", "tags": ["foo"]}
+
+Situations are exported with their local start and end, which are aligned to
+the round::
+
+    {"type": "work", "start": "2018-04-01T08:00:00+02:00",
+     "end": "2018-04-01T12:00:00+02:00", "seconds": 14400.0,
+     "tags": ["foo"], "notes": []}
+"""
+import csv
+import heapq
+import json
+
+from . import importing, sourcing, store, utils
+
+FORMATS = importing.FORMATS
+EVENT_FIELDS = importing.CSV_FIELDS
+SITUATION_FIELDS = ('type', 'start', 'end', 'seconds', 'tags', 'notes')
+GROUP_FIELD = 'group'
+
+
+def event_row(event):
+    source = dict(event.source())
+    return {
+        'type': event.type,
+        'when': str(event.when),
+        'tags': list(event.tags),
+        'note': source.get('note'),
+    }
+
+
+def situation_row(situation):
+    local_start, local_end = situation.local_start, situation.local_end
+    local_period = situation.local_period
+    return {
+        'type': situation.__class__.__name__.lower(),
+        'start': local_start.isoformat() if local_start else None,
+        'end': local_end.isoformat() if local_end else None,
+        'seconds': local_period.total_seconds()
+        if local_period is not None else None,
+        'tags': list(situation.tags),
+        'notes': list(situation.notes),
+    }
+
+
+def write_jsonl(rows, fields, file):
+    for row in rows:
+        file.write(json.dumps(row))
+        file.write('\n')
+
+
+def write_csv(rows, fields, file):
+    """Write rows as CSV.
+
+    Tags are joined by commas, like they are imported, and notes by new
+    lines.
+    """
+    writer = csv.DictWriter(file, fields, lineterminator='\n')
+    writer.writeheader()
+    for row in rows:
+        if row.get('tags') is not None:
+            row['tags'] = ','.join(row['tags'])
+        if row.get('notes') is not None:
+            row['notes'] = '\n'.join(row['notes'])
+        writer.writerow(row)
+
+
+WRITERS = {
+    'jsonl': write_jsonl,
+    'csv': write_csv,
+}
+
+
+class Export:
+
+    """Stream the events or situations of a time frame.
+
+    :param situations: export the sourced situations, otherwise the raw
+        events.
+    """
+
+    def __init__(self, store, *, start, end, round=None, all_groups=False,
+                 situations=True):
+        self.store = store
+        self.start = start
+        self.end = end
+        self.round = round
+        self.all_groups = all_groups
+        self.situations = situations
+
+    @property
+    def fields(self):
+        fields = SITUATION_FIELDS if self.situations else EVENT_FIELDS
+        return fields + (GROUP_FIELD,) if self.all_groups else fields
+
+    def source(self):
+        if self.all_groups:
+            return self.store.source_groups(
+                start=self.start, end=self.end, round=self.round)
+        return sourcing.Sourcerer(self.store)\
+            .generate(start=self.start, end=self.end, round=self.round)
+
+    def iter_events(self, group_store):
+        """Generate the events of a group in this time frame."""
+        timeline = group_store.iter_names()
+        position = timeline.bisect(utils.epoch_micros(self.start))\
+            if self.start else 0
+        stop = timeline.bisect(utils.epoch_micros(self.end))\
+            if self.end else len(timeline)
+        return sourcing.Sourcerer(group_store).iter_events(
+            timeline, position, stop)
+
+    def _iter_group_rows(self, group):
+        group_store = store.Store(store_path=self.store.store_path,
+                                  group=group)
+        for event in self.iter_events(group_store):
+            row = event_row(event)
+            row[GROUP_FIELD] = group
+            yield utils.epoch_micros(event.when), row
+
+    def rows(self):
+        if self.situations:
+            for situation in self.source():
+                row = situation_row(situation)
+                if self.all_groups:
+                    row[GROUP_FIELD] = situation.group
+                yield row
+        elif self.all_groups:
+            streams = [self._iter_group_rows(group)
+                       for group in sorted(self.store.groups)]
+            for _, row in heapq.merge(*streams, key=lambda x: x[0]):
+                yield row
+        else:
+            yield from map(event_row, self.iter_events(self.store))
+
+    def write(self, file, format='jsonl'):
+        try:
+            writer = WRITERS[format]
+        except KeyError:
+            raise ValueError(f'Unknown export format: {format}')
+        writer(self.rows(), self.fields, file)
@@ -0,0 +1,155 @@
+# Copyright 2018 Oliver Berger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""The head record of a group.
+
+It holds the last created event and the situation after the latest event, so
+the status of a group is known without looking at all events::
+
+    name = "<last created event>"
+    created = <creation time>
+    when = <UTC epoch microseconds of the latest event>
+
+    [situation]
+    type = "work"
+    start = "<UTC timestamp>"
+    tags = []
+    notes = []
+
+    [stamp]
+    "<event source path>" = [<modification time>, <size or entries>]
+
+Every persisted event updates the head. Parts, which can not be updated
+without sourcing, are dropped and found again on demand. The stamp of the
+event sources tells, if they were changed behind the head.
+"""
+import logging
+import os
+
+import qtoml
+
+from . import checkpoints, events, utils
+
+log = logging.getLogger(__name__)
+
+
+class Head:
+
+    """The head record of a group.
+
+    :param path: the file to persist the head in or `None` to keep it in
+        memory only.
+    :param sources: a function returning all paths, whose modification
+        invalidates the head.
+    """
+
+    def __init__(self, path=None, sources=None):
+        self.path = path
+        self.sources = sources
+        self._head = None
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.path}>'
+
+    @property
+    def head(self):
+        if self._head is None:
+            self._head = {}
+            if self.path is not None and self.path.is_file():
+                with self.path.open('r') as head_file:
+                    self._head.update(qtoml.load(head_file))
+        return self._head
+
+    def dump(self):
+        if self.path is None:
+            return
+        stamp = utils.stat_stamp(self.sources())\
+            if self.sources is not None else None
+        if stamp is not None:
+            self.head['stamp'] = stamp
+        else:
+            self.head.pop('stamp', None)
+        tmp_path = self.path.with_name(f'.{self.path.name}.tmp')
+        with tmp_path.open('w') as head_file:
+            qtoml.dump(self.head, head_file)
+        os.replace(str(tmp_path), str(self.path))
+
+    def is_fresh(self):
+        """Test if the sources did not change since the head was written."""
+        if self.sources is None or self.path is None\
+                or not self.path.is_file():
+            return False
+        stamp = self.head.get('stamp')
+        return stamp is not None and stamp == utils.stat_stamp(self.sources())
+
+    @property
+    def name(self):
+        return self.head.get('name')
+
+    @property
+    def created(self):
+        return self.head.get('created')
+
+    @property
+    def situation(self):
+        """The situation after the latest event or `None` if unknown."""
+        data = self.head.get('situation')
+        return checkpoints.load_situation(data) if data is not None else None
+
+    def set_last(self, name, created):
+        """Store the last created event."""
+        self.head.update(name=name, created=created)
+        self.dump()
+
+    def set_situation(self, when, situation):
+        """Store the situation after the latest event at `when`.
+
+        :param when: UTC epoch microseconds.
+        """
+        self.head.update(when=when,
+                         situation=checkpoints.dump_situation(situation))
+        self.dump()
+
+    def update(self, name, event, created):
+        """Apply a new event to the head."""
+        head = self.head
+        when = utils.epoch_micros(event.when)
+        situation = self.situation
+        head.update(name=name, created=created)
+        if situation is not None and when > head['when']:
+            if isinstance(event, events.SituationEvent):
+                situation = event.create_situation()
+            else:
+                event.apply_to_situation(situation)
+            head.update(when=when,
+                        situation=checkpoints.dump_situation(situation))
+        else:
+            # a past event may change everything after it
+            head.pop('when', None)
+            head.pop('situation', None)
+        self.dump()
+
+    def remove(self, name):
+        """Drop all parts of the head, which a removed event may change."""
+        if self.head:
+            if self.head.get('name') == name:
+                self.head.clear()
+            else:
+                self.head.pop('when', None)
+                self.head.pop('situation', None)
+            self.dump()
+
+    def clear(self):
+        if self.head:
+            self.head.clear()
+            self.dump()
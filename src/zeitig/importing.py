@@ -0,0 +1,146 @@
+# Copyright 2018 Oliver Berger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Read events from other trackers.
+
+Every row or line is one event with the parameters of `events.Event`::
+
+    {"type": "work", "when": "2018-04-01 08:00", "tags": ["foo"], "note": ""}
+
+    type,when,tags,note
+    work,2018-04-01 08:00,"foo,bar",
+
+Timestamps without an offset are local times. The rows are read lazily, so
+inputs of any size are imported in bounded memory.
+"""
+import csv
+import json
+import re
+
+import pendulum
+
+from . import events
+
+CSV_FIELDS = ('type', 'when', 'tags', 'note')
+FORMATS = ('jsonl', 'csv')
+
+
+class ImportException(Exception):
+    def __init__(self, line, message):
+        super().__init__(line, message)
+        self.line = line
+        self.message = message
+
+    def __str__(self):
+        return f'Line {self.line}: {self.message}'
+
+
+def guess_format(filename, default='jsonl'):
+    """The format of a file by its extension."""
+    for format in FORMATS:
+        if str(filename).endswith(f'.{format}'):
+            return format
+    return default
+
+
+def read_jsonl(file):
+    """Generate the line numbers and the sources of JSON lines."""
+    for line, text in enumerate(file, 1):
+        if not text.strip():
+            continue
+        try:
+            source = json.loads(text)
+        except ValueError as ex:
+            raise ImportException(line, f'Invalid JSON: {ex}')
+        if not isinstance(source, dict):
+            raise ImportException(line, 'An event has to be an object')
+        yield line, source
+
+
+def read_csv(file):
+    """Generate the line numbers and the sources of CSV rows.
+
+    Tags are separated by commas and empty cells are omitted.
+    """
+    reader = csv.DictReader(file)
+    unknown = set(reader.fieldnames or ()) - set(CSV_FIELDS)
+    if unknown:
+        raise ImportException(1, f'Unknown columns: {", ".join(unknown)}')
+    for row in reader:
+        source = {field: value for field, value in row.items() if value}
+        if 'tags' in source:
+            source['tags'] = [tag.strip() for tag in source['tags'].split(',')
+                              if tag.strip()]
+        yield reader.line_num, source
+
+
+READERS = {
+    'jsonl': read_jsonl,
+    'csv': read_csv,
+}
+
+
+def create_event(source, tz):
+    """Validate a source and create its event.
+
+    :raises ValueError: if the source is not a valid event.
+    """
+    source = dict(source)
+    event_type = source.pop('type', None)
+    event_cls = events.Event.__events__.get(event_type)
+    if event_cls is None:
+        raise ValueError(f'Unknown event type: {event_type}')
+    unknown = set(source) - set(event_cls.__params__)
+    if unknown:
+        raise ValueError(f'Unknown parameters: {", ".join(sorted(unknown))}')
+    if 'when' not in source:
+        raise ValueError('An event needs a time')
+    try:
+        when = pendulum.parse(str(source.pop('when')), tz=tz)
+    except Exception as ex:
+        raise ValueError(f'Invalid time: {ex}')
+    event = event_cls(when=when.in_tz('UTC'))
+    tags = source.pop('tags', None)
+    if tags:
+        if not isinstance(tags, list) or not all(isinstance(tag, str)
+                                                 for tag in tags):
+            raise ValueError('Tags have to be a list of strings')
+        event.tags = tags
+    note = source.pop('note', None)
+    if note:
+        if not isinstance(note, str):
+            raise ValueError('A note has to be a string')
+        if isinstance(event, events.RemoveEvent):
+            try:
+                note = re.compile(note)
+            except re.error as ex:
+                raise ValueError(f'Invalid note regex: {ex}')
+        event.note = note
+    return event
+
+
+def iter_events(file, format='jsonl', tz=None):
+    """Generate the events of a file.
+
+    :raises ImportException: with the line of the first invalid event.
+    """
+    tz = tz if tz is not None else events.get_local_timezone()
+    try:
+        reader = READERS[format]
+    except KeyError:
+        raise ValueError(f'Unknown import format: {format}')
+    for line, source in reader(file):
+        try:
+            yield create_event(source, tz)
+        except ValueError as ex:
+            raise ImportException(line, ex.args[0])
@@ -0,0 +1,209 @@
+# Copyright 2018 Oliver Berger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A persistent sorted index of all event timestamps of a group.
+
+The index is a file of fixed size records::
+
+    <UTC epoch microseconds: long long> <event name: 40 bytes>
+
+So we are able to binary search for a position without reading the whole
+file. The stamp of the event sources the index was written for is kept
+beside it, so any change of them is noticed.
+"""
+import logging
+import marshal
+import mmap
+import os
+import struct
+
+from . import utils
+
+log = logging.getLogger(__name__)
+
+RECORD = struct.Struct('>q40s')
+
+
+def encode_record(name):
+    when = utils.epoch_micros(utils.parse_utc(name))
+    return RECORD.pack(when, name.encode('utf-8'))
+
+
+def record_key(record):
+    """Records sort by their signed timestamps, not by their bytes."""
+    return RECORD.unpack(record)
+
+
+class TimestampIndex:
+
+    """Sorted event timestamps backed by a file.
+
+    It is the timeline of a group: the name and the UTC epoch microseconds of
+    every event are found by their position.
+
+    :param sources: a function returning all paths, whose modification
+        invalidates the index.
+    """
+
+    def __init__(self, path, sources=None):
+        self.path = path
+        self.stamp_path = path.with_name(f'{path.name}.stamp')
+        self.sources = sources
+        self._data = None
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.path}>'
+
+    @property
+    def data(self):
+        if self._data is None:
+            if self.path.is_file() and self.path.stat().st_size:
+                with self.path.open('rb') as index_file:
+                    self._data = mmap.mmap(index_file.fileno(), 0,
+                                           access=mmap.ACCESS_READ)
+            else:
+                self._data = b''
+        return self._data
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = None
+
+    def __len__(self):
+        return len(self.data) // RECORD.size
+
+    def __getitem__(self, position):
+        """Return the epoch microseconds and the name at this position."""
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        when, name = RECORD.unpack_from(self.data, position * RECORD.size)
+        return when, name.rstrip(b'\0').decode('utf-8')
+
+    def __iter__(self):
+        return (self.name(position) for position in range(len(self)))
+
+    def name(self, position):
+        return self[position][1]
+
+    def when(self, position):
+        """The epoch microseconds of the event at this position."""
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return RECORD.unpack_from(self.data, position * RECORD.size)[0]
+
+    def bisect(self, when):
+        """Find the first position at or after `when` epoch microseconds."""
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.when(middle) < when:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def names(self):
+        return list(self)
+
+    @property
+    def stamp(self):
+        """The stamp of the sources, when the index was written last."""
+        try:
+            with self.stamp_path.open('rb') as stamp_file:
+                return marshal.load(stamp_file)
+        except FileNotFoundError:
+            return None
+        except (EOFError, ValueError, TypeError):
+            log.warning('Ignoring broken index stamp: %s', self.stamp_path)
+            return None
+
+    def dump_stamp(self):
+        """Remember the sources, which the index reflects now."""
+        if self.sources is None:
+            return
+        tmp_path = self.stamp_path.with_name(f'.{self.stamp_path.name}.tmp')
+        with tmp_path.open('wb') as stamp_file:
+            marshal.dump(utils.stat_stamp(self.sources()), stamp_file)
+        os.replace(str(tmp_path), str(self.stamp_path))
+
+    def is_fresh(self):
+        """Test if the sources did not change since the index was written."""
+        if self.sources is None or not self.path.is_file():
+            return False
+        stamp = self.stamp
+        return stamp is not None and stamp == utils.stat_stamp(self.sources())
+
+    def _write(self, records):
+        self.close()
+        tmp_path = self.path.with_name(f'.{self.path.name}.tmp')
+        with tmp_path.open('wb') as index_file:
+            for record in records:
+                index_file.write(record)
+        os.replace(str(tmp_path), str(self.path))
+        self.dump_stamp()
+
+    def rebuild(self, names):
+        """Write a new index for all names."""
+        records = sorted((encode_record(name) for name in names),
+                         key=record_key)
+        self._write(records)
+        log.info('Rebuilt index %s with %s events', self.path, len(records))
+
+    def insert(self, name):
+        """Insert an event name into the index."""
+        record = encode_record(name)
+        size = len(self)
+        if size and self[size - 1][1] == name:
+            self.dump_stamp()
+            return
+        if not size or record_key(self.data[-RECORD.size:])\
+                < record_key(record):
+            # events are usually recorded in order
+            self.close()
+            with self.path.open('ab') as index_file:
+                index_file.write(record)
+            self.dump_stamp()
+            return
+        records = set(self.records())
+        records.add(record)
+        self._write(sorted(records, key=record_key))
+
+    def insert_many(self, names):
+        """Append event names, which are all later than the indexed ones.
+
+        :returns: `False` if the names can not be appended.
+        """
+        records = sorted(set(map(encode_record, names)), key=record_key)
+        if not records:
+            return True
+        if len(self) and record_key(self.data[-RECORD.size:])\
+                >= record_key(records[0]):
+            return False
+        self.close()
+        with self.path.open('ab') as index_file:
+            index_file.write(b''.join(records))
+        self.dump_stamp()
+        return True
+
+    def remove(self, name):
+        """Remove an event name from the index."""
+        records = [record for record in self.records()
+                   if RECORD.unpack(record)[1].rstrip(b'\0')
+                   != name.encode('utf-8')]
+        self._write(records)
+
+    def records(self):
+        data = self.data
+        return [data[offset:offset + RECORD.size]
+                for offset in range(0, len(data), RECORD.size)]
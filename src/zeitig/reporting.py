@@ -11,7 +11,16 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import asyncio
+import compileall
+import hashlib
+import importlib.machinery
+import json
 import logging
+import pathlib
+import shutil
+import sys
+import threading
 
 import click
 import colorama
@@ -27,7 +36,15 @@ log = logging.getLogger(__name__)
 TEMPLATE_DEFAULTS_NAME = 'template_defaults.toml'
 TEMPLATE_SYNTAX_NAME = 'template_syntax.toml'
 TEMPLATE_PATH_NAME = 'templates'
-CACHE_PATH_NAME = 'cache'
+CACHE_PATH_NAME = store.CACHE_PATH_NAME
+COMPILED_PATH_NAME = 'compiled'
+MANIFEST_NAME = 'manifest.toml'
+PACKAGE_TEMPLATE_PATH = pathlib.Path(__file__).parent.joinpath(
+    TEMPLATE_PATH_NAME)
+# the maximal number of situations sourced ahead of the template
+READ_AHEAD = 64
+# the number of chunks rendered at once by `Report.generate`
+STREAM_CHUNKS = 64
 
 
 class ReportException(Exception):
@@ -58,28 +75,21 @@ class State:
                 f'{", ".join(sorted(self.store.groups))}'
             )
 
-            sourcerer = sourcing.Sourcerer(self.store)
-            last_event_path, last_event_stat = \
-                next(reversed(self.store.iter_names_created()), (None, None))
-
-            if last_event_path:
-                last_event = sourcerer.load_event(
-                    store.EventSource(last_event_path.name))
-                last_situation = next(
-                    sourcerer.generate(start=last_event.when),
-                    None)
-                if last_situation:
-                    click.echo(
-                        f'Last situation in {self.store.group_path.name}: '
-                        f'{colorama.Style.BRIGHT}'
-                        f'{last_situation}'
-                        f'{colorama.Style.RESET_ALL} '
-                        f'started at {colorama.Style.BRIGHT}'
-                        f'{last_situation.local_start}'
-                        f'{colorama.Style.RESET_ALL} since '
-                        f'{last_situation.period.total_hours():.2f} hours'
-                        f'{" - " + ", ".join(last_situation.tags)}'
-                    )
+            last_situation = \
+                sourcing.Sourcerer(self.store).current_situation()
+            if last_situation and last_situation.start is not None:
+                last_situation.end = utils.utcnow()
+                click.echo(
+                    f'Last situation in {self.store.group_path.name}: '
+                    f'{colorama.Style.BRIGHT}'
+                    f'{last_situation}'
+                    f'{colorama.Style.RESET_ALL} '
+                    f'started at {colorama.Style.BRIGHT}'
+                    f'{last_situation.local_start}'
+                    f'{colorama.Style.RESET_ALL} since '
+                    f'{last_situation.period.total_hours():.2f} hours'
+                    f'{" - " + ", ".join(last_situation.tags)}'
+                )
         except store.LastPathNotSetException:
             if self.store.groups:
                 click.echo(f'{colorama.Fore.YELLOW}'
@@ -115,16 +125,48 @@ DEFAULT_JINJA_ENVS = {
 }
 
 
+async def take(chunks, count):
+    """Take up to `count` items of an async iterator."""
+    taken = []
+    async for chunk in chunks:
+        taken.append(chunk)
+        if len(taken) >= count:
+            break
+    return taken
+
+
+# parsed config files by path: (content, data)
+_CONFIGS = {}
+# jinja environments by syntax and paths
+_JINJA_ENVS = {}
+
+
+def load_config(path):
+    """Parse a toml config file once per modification.
+
+    The files are small, so they are compared by their content, which
+    changes even within the resolution of the modification times.
+
+    :returns: the data or `None` if there is no such file.
+    """
+    try:
+        content = path.read_text()
+    except FileNotFoundError:
+        _CONFIGS.pop(path, None)
+        return None
+    cached = _CONFIGS.get(path)
+    if cached is None or cached[0] != content:
+        cached = _CONFIGS[path] = (content, qtoml.loads(content))
+    return cached[1]
+
+
 class TemplatesCache(jinja2.BytecodeCache):
     def __init__(self, store):
         self.store = store
 
     @utils.reify
     def cache_path(self):
-        path = self.store.store_path.joinpath(CACHE_PATH_NAME)
-        if not path.is_dir():
-            path.mkdir()
-        return path
+        return self.store.cache_path
 
     def load_bytecode(self, bucket):
         filename = self.cache_path.joinpath(bucket.key)
@@ -138,6 +180,81 @@ class TemplatesCache(jinja2.BytecodeCache):
             bucket.write_bytecode(f)
 
 
+class CompiledLoader(jinja2.BaseLoader):
+
+    """Load templates precompiled by `Templates.compile_templates`.
+
+    The manifest records the source file and its modification time of every
+    compiled template. A template, which was not compiled or whose source
+    changed since, is not found here, so the next loader of a `ChoiceLoader`
+    compiles it from source.
+
+    :param path: the directory of the compiled templates.
+    :param search_paths: the template directories in the order they are
+        searched by the source loaders.
+    """
+
+    def __init__(self, path, search_paths):
+        self.path = path
+        self.manifest_path = path.joinpath(MANIFEST_NAME)
+        self.search_paths = search_paths
+
+    @property
+    def manifest(self):
+        manifest = load_config(self.manifest_path)
+        return manifest.get('templates', {}) if manifest else {}
+
+    def find_source(self, name):
+        """The path and modification time of the source of a template."""
+        for search_path in self.search_paths:
+            path = search_path.joinpath(*name.split('/'))
+            try:
+                return str(path), path.stat().st_mtime_ns
+            except FileNotFoundError:
+                pass
+        return None, None
+
+    def get_uptodate(self, name):
+        """Return the uptodate function of a compiled template.
+
+        :raises jinja2.exceptions.TemplateNotFound: if the template was not
+            compiled from its current source.
+        """
+        compiled = self.manifest.get(name)
+        source = self.find_source(name)
+        if compiled is None\
+                or (compiled['filename'], compiled['mtime']) != source:
+            raise jinja2.exceptions.TemplateNotFound(name)
+
+        def uptodate():
+            return self.find_source(name) == source
+        return uptodate
+
+    def get_source(self, environment, template):
+        uptodate = self.get_uptodate(template)
+        filename, _ = self.find_source(template)
+        with open(filename, 'r') as source_file:
+            return source_file.read(), filename, uptodate
+
+    def list_templates(self):
+        return sorted(self.manifest)
+
+    def load(self, environment, name, globals=None):
+        uptodate = self.get_uptodate(name)
+        module_path = self.path.joinpath(
+            jinja2.ModuleLoader.get_module_filename(name))
+        # the bytecode written by `compile_templates` is used if it is valid
+        module_loader = importlib.machinery.SourceFileLoader(
+            module_path.stem, str(module_path))
+        try:
+            code = module_loader.get_code(module_path.stem)
+        except OSError:
+            raise jinja2.exceptions.TemplateNotFound(name)
+        return environment.template_class.from_code(
+            environment, code, globals if globals is not None else {},
+            uptodate)
+
+
 class Templates:
     def __init__(self, store):
         self.store = store
@@ -160,10 +277,9 @@ class Templates:
                 self.user_defaults_file_path,
                 self.group_defaults_file_path,
         ):
-            if default_file_path.is_file():
-                with default_file_path.open('r') as default_file:
-                    data = qtoml.load(default_file)
-                    defaults.update(data)
+            data = load_config(default_file_path)
+            if data is not None:
+                defaults.update(data)
         return defaults
 
     def get_template_syntax(self, template_name):
@@ -173,31 +289,94 @@ class Templates:
                 self.store.user_path.joinpath(TEMPLATE_SYNTAX_NAME),
                 self.store.group_path.joinpath(TEMPLATE_SYNTAX_NAME),
         ):
-            if syntax_file_path.is_file():
-                with syntax_file_path.open('r') as syntax_file:
-                    syntax = qtoml.load(syntax_file)
-                    jinja_envs.update(syntax.get('jinja_env', {}))
-                    templates.update(syntax.get('templates', {}))
+            syntax = load_config(syntax_file_path)
+            if syntax is not None:
+                jinja_envs.update(syntax.get('jinja_env', {}))
+                templates.update(syntax.get('templates', {}))
 
         template_syntax_name = templates.get(template_name, None)
         template_syntax = jinja_envs.get(template_syntax_name, None)
         return template_syntax
 
     def get_jinja_env(self, template_name):
+        """Return the environment of the template syntax.
+
+        Environments are shared in the process, so their compiled templates
+        are reused by later reports.
+        """
         syntax = self.get_template_syntax(template_name=template_name)
-        env = jinja2.Environment(
-            bytecode_cache=TemplatesCache(self.store),
-            enable_async=True,
-            loader=jinja2.ChoiceLoader([
-                jinja2.FileSystemLoader(
-                    str(self.store.group_path.joinpath(TEMPLATE_PATH_NAME))),
-                jinja2.FileSystemLoader(
-                    str(self.store.user_path.joinpath(TEMPLATE_PATH_NAME))),
-                jinja2.PackageLoader('zeitig', 'templates'),
-            ]), **syntax
-        )
+        # options may be lists like `extensions`
+        key = (json.dumps(syntax, sort_keys=True),
+               tuple(map(str, self.search_paths)))
+        env = _JINJA_ENVS.get((key, self.compiled_path))
+        if env is None:
+            env = _JINJA_ENVS[key, self.compiled_path] = jinja2.Environment(
+                bytecode_cache=TemplatesCache(self.store),
+                enable_async=True,
+                loader=jinja2.ChoiceLoader([
+                    CompiledLoader(
+                        self.compiled_path.joinpath(
+                            hashlib.sha1(repr(key).encode()).hexdigest()),
+                        self.search_paths),
+                    *(jinja2.FileSystemLoader(str(path))
+                      for path in self.search_paths[:-1]),
+                    jinja2.PackageLoader('zeitig', TEMPLATE_PATH_NAME),
+                ]), **syntax
+            )
         return env
 
+    @utils.reify
+    def search_paths(self):
+        """The template directories of the group, the user and the package."""
+        return (
+            self.store.group_path.joinpath(TEMPLATE_PATH_NAME),
+            self.store.user_path.joinpath(TEMPLATE_PATH_NAME),
+            PACKAGE_TEMPLATE_PATH,
+        )
+
+    @utils.reify
+    def compiled_path(self):
+        return self.store.cache_path.joinpath(COMPILED_PATH_NAME)
+
+    def list_templates(self):
+        return sorted({
+            path.relative_to(search_path).as_posix()
+            for search_path in self.search_paths if search_path.is_dir()
+            for path in search_path.rglob('*')
+            if path.is_file() and not path.name.startswith('.')
+        })
+
+    def compile_templates(self, log_function=None):
+        """Precompile all templates into modules.
+
+        Every template is compiled by the environment of its syntax.
+
+        :returns: the names of the compiled templates.
+        """
+        names = self.list_templates()
+        envs = {name: self.get_jinja_env(name) for name in names}
+        # other groups keep their compiled templates in the same directory
+        for path in {env.loader.loaders[0].path for env in envs.values()}:
+            if path.is_dir():
+                shutil.rmtree(str(path))
+        manifests = {}
+        for name, env in envs.items():
+            loader = env.loader.loaders[0]
+            env.compile_templates(
+                str(loader.path), filter_func=name.__eq__, zip=None,
+                log_function=log_function, ignore_errors=False)
+            filename, mtime = loader.find_source(name)
+            manifests.setdefault(loader.manifest_path, {})[name] = {
+                'filename': filename,
+                'mtime': mtime,
+            }
+        for manifest_path, manifest in manifests.items():
+            # imports may not write bytecode
+            compileall.compile_dir(str(manifest_path.parent), quiet=1)
+            manifest_path.write_text(qtoml.dumps({'templates': manifest}))
+            _CONFIGS.pop(manifest_path, None)
+        return names
+
     def get_template(self, template_name):
         env = self.get_jinja_env(template_name)
         template = env.get_template(template_name)
@@ -205,13 +384,60 @@ class Templates:
 
 
 class Report(Templates):
-    def __init__(self, store, *, start, end, round=None):
+    def __init__(self, store, *, start, end, round=None, all_groups=False):
         super().__init__(store)
         self.start = start
         self.end = end
         self.round = round
-
-    def render(self, template_name=None):
+        self.all_groups = all_groups
+
+    def source(self):
+        """Generate the situations, only if a template iterates them."""
+        if self.all_groups:
+            yield from self.store.source_groups(
+                start=self.start, end=self.end, round=self.round)
+        else:
+            yield from sourcing.Sourcerer(self.store)\
+                .generate(start=self.start, end=self.end, round=self.round)
+
+    def days(self):
+        """Generate the `rollups.DayRollup` of every local day.
+
+        The rollups of all groups are joined per day.
+        """
+        tz = events.get_local_timezone()
+        if self.all_groups:
+            return self.store.source_groups_days(
+                start=self.start, end=self.end, round=self.round, tz=tz)
+        return sourcing.Sourcerer(self.store).generate_days(
+            start=self.start, end=self.end, round=self.round, tz=tz)
+
+    def work_days(self):
+        """Generate the `aggregates.JoinedWorkDay` of all days with work.
+
+        Closed days are read from the rollups, so only open days are
+        sourced.
+        """
+        tz = events.get_local_timezone()
+        for day_rollup in self.days():
+            if day_rollup.work_micros:
+                yield aggregates.JoinedWorkDay.from_rollup(day_rollup, tz)
+
+    def context(self, *, read_ahead=False):
+        """The template context.
+
+        :param read_ahead: source the situations and days in a thread, while
+            the template is rendered.
+        """
+        source = self.source()
+        days = self.days()
+        work_days = self.work_days()
+        if read_ahead:
+            # the threads must not use the store at the same time
+            lock = threading.Lock()
+            source = utils.read_ahead(source, READ_AHEAD, lock=lock)
+            days = utils.read_ahead(days, READ_AHEAD, lock=lock)
+            work_days = utils.read_ahead(work_days, READ_AHEAD, lock=lock)
         context = self.join_template_defaults()
         context.update({
             'py': {
@@ -220,9 +446,11 @@ class Report(Templates):
             'report': {
                 'start': self.start,
                 'end': self.end,
-                'group': self.store.group_path.name,
-                'source': sourcing.Sourcerer(self.store)
-                .generate(start=self.start, end=self.end, round=self.round),
+                'group': ', '.join(sorted(self.store.groups))
+                if self.all_groups else self.store.group_path.name,
+                'source': source,
+                'days': days,
+                'work_days': work_days,
             },
             'events': {
                 'Summary': aggregates.Summary,
@@ -231,6 +459,7 @@ class Report(Templates):
                 'Work': events.Work,
                 'Break': events.Break,
                 'Situation': events.Situation,
+                'JoinedWorkDay': aggregates.JoinedWorkDay,
                 'filter_no_breaks': aggregates.filter_no_breaks,
                 'split_at_new_day': aggregates.split_at_new_day,
                 'pipeline': utils.pipeline,
@@ -242,15 +471,71 @@ class Report(Templates):
             },
             'c': crayons,
         })
+        return context
+
+    def load_template(self, template_name):
         try:
-            template = self.get_template(template_name)
-            rendered = template.render(**context)
+            return self.get_template(template_name)
         except jinja2.exceptions.TemplateAssertionError as ex:
             log.error('%s at line %s', ex, ex.lineno)
             raise
         except jinja2.exceptions.TemplateNotFound as ex:
             raise ReportTemplateNotFound(*sorted(ex.__dict__.items()))
-        return rendered
 
-    def print(self, *, template_name=None):
-        print(self.render(template_name=template_name))
+    def generate(self, template_name=None, *, read_ahead=False):
+        """Render the report chunk by chunk, while the source is consumed.
+
+        The environment is async, so `Template.generate` would collect all
+        chunks before yielding them. We step through `generate_async`
+        instead.
+        """
+        template = self.load_template(template_name)
+        chunks = template.generate_async(
+            **self.context(read_ahead=read_ahead))
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                try:
+                    # a loop step per chunk is too slow
+                    taken = loop.run_until_complete(
+                        take(chunks, STREAM_CHUNKS))
+                except jinja2.exceptions.TemplateNotFound as ex:
+                    raise ReportTemplateNotFound(
+                        *sorted(ex.__dict__.items()))
+                if not taken:
+                    break
+                yield from taken
+        finally:
+            loop.run_until_complete(chunks.aclose())
+            loop.close()
+
+    async def generate_async(self, template_name=None):
+        """Render the report chunk by chunk for the running event loop.
+
+        Templates iterate their sources synchronously, so the report is
+        rendered in a thread, while the situations are sourced in another
+        one.
+        """
+        async for chunk in utils.iterate_async(
+                self.generate(template_name, read_ahead=True)):
+            yield chunk
+
+    def render(self, template_name=None):
+        return ''.join(self.generate(template_name=template_name))
+
+    async def render_async(self, template_name=None):
+        return ''.join([chunk async for chunk in self.generate_async(
+            template_name=template_name)])
+
+    def print(self, *, template_name=None, file=None):
+        """Write the report to a file or stdout as it is rendered."""
+        file = file if file is not None else sys.stdout
+        for chunk in self.generate(template_name=template_name):
+            file.write(chunk)
+        file.write('\n')
+
+    async def print_async(self, *, template_name=None, file=None):
+        file = file if file is not None else sys.stdout
+        async for chunk in self.generate_async(template_name=template_name):
+            file.write(chunk)
+        file.write('\n')
@@ -0,0 +1,213 @@
+# Copyright 2018 Oliver Berger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Persisted work and break totals of closed local days.
+
+A day is closed, if all situations overlapping it were closed by a later
+situation event. Its rollup remembers the start of the first and the end of
+the last situation overlapping it, since only an event between these may
+change the day.
+"""
+import logging
+import marshal
+import os
+
+import pendulum
+
+from . import events
+
+log = logging.getLogger(__name__)
+
+ROLLUPS_VERSION = 1
+
+
+def rollup_key(tz, round=None):
+    """Rollups depend on the local timezone and the round."""
+    return f'{tz.name} {round.size if round else 0}'
+
+
+class DayRollup:
+
+    """The work and break totals of a local day.
+
+    :param first: the UTC epoch microseconds of the first situation start or
+        `None` if it started before all events.
+    :param last: the UTC epoch microseconds of the last situation end or
+        `None` if it is still open.
+    """
+
+    __slots__ = ('date', 'work_micros', 'break_micros', 'tags', 'notes',
+                 'first', 'last', 'situations')
+
+    def __init__(self, date, work_micros=0, break_micros=0, tags=None,
+                 notes=None, first=None, last=None):
+        self.date = date
+        self.work_micros = work_micros
+        self.break_micros = break_micros
+        self.tags = tags if tags is not None else []
+        self.notes = notes if notes is not None else []
+        self.first = first
+        self.last = last
+        # the number of situations added
+        self.situations = 0
+
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} {self.date}'
+                f' work {self.works} break {self.breaks} - {self.tags}>')
+
+    def __eq__(self, other):
+        return self.dump() == other.dump()\
+            and self.date == other.date
+
+    @property
+    def works(self):
+        return pendulum.duration(microseconds=self.work_micros)
+
+    @property
+    def breaks(self):
+        return pendulum.duration(microseconds=self.break_micros)
+
+    def add_situation(self, situation, micros, first, last):
+        """Add the part of a situation, which belongs to this day."""
+        if isinstance(situation, events.Work):
+            self.work_micros += micros
+            self.tags.extend(tag for tag in situation.tags
+                             if tag not in self.tags)
+            self.notes.extend(note for note in situation.notes
+                              if note not in self.notes)
+        else:
+            self.break_micros += micros
+        if not self.situations:
+            self.first, self.last = first, last
+        else:
+            if first is None\
+                    or self.first is not None and first < self.first:
+                self.first = first
+            if self.last is not None and (last is None or last > self.last):
+                self.last = last
+        self.situations += 1
+
+    def dump(self):
+        return (self.work_micros, self.break_micros, self.tags, self.notes,
+                self.first, self.last)
+
+    @classmethod
+    def load(cls, date, data):
+        return cls(date, *data)
+
+    @classmethod
+    def merge(cls, day_rollups):
+        """Join the rollups of the same local date of several groups."""
+        first, *others = day_rollups
+        day = cls(first.date, first.work_micros, first.break_micros,
+                  list(first.tags), list(first.notes), first.first,
+                  first.last)
+        day.situations = first.situations
+        for day_rollup in others:
+            day.work_micros += day_rollup.work_micros
+            day.break_micros += day_rollup.break_micros
+            day.tags.extend(tag for tag in day_rollup.tags
+                            if tag not in day.tags)
+            day.notes.extend(note for note in day_rollup.notes
+                             if note not in day.notes)
+            if day_rollup.first is None or day.first is not None\
+                    and day_rollup.first < day.first:
+                day.first = day_rollup.first
+            if day.last is not None and (day_rollup.last is None
+                                         or day_rollup.last > day.last):
+                day.last = day_rollup.last
+            day.situations += day_rollup.situations
+        return day
+
+
+class Rollups:
+
+    """The day rollups of a group.
+
+    :param path: the file to persist the rollups in or `None` to keep them in
+        memory only.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._rollups = None
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.path}>'
+
+    @property
+    def rollups(self):
+        if self._rollups is None:
+            self._rollups = {}
+            if self.path is not None and self.path.is_file():
+                try:
+                    with self.path.open('rb') as rollups_file:
+                        version, rollups = marshal.load(rollups_file)
+                except (EOFError, ValueError, TypeError):
+                    log.warning('Ignoring broken rollups: %s', self.path)
+                else:
+                    if version == ROLLUPS_VERSION:
+                        self._rollups = rollups
+        return self._rollups
+
+    def dump(self):
+        if self.path is None:
+            return
+        tmp_path = self.path.with_name(f'.{self.path.name}.tmp')
+        with tmp_path.open('wb') as rollups_file:
+            marshal.dump((ROLLUPS_VERSION, self.rollups), rollups_file)
+        os.replace(str(tmp_path), str(self.path))
+
+    def get(self, key, date):
+        """Return the rollup of this local date or `None`."""
+        try:
+            data = self.rollups[key][date.isoformat()]
+        except KeyError:
+            return None
+        return DayRollup.load(date, data)
+
+    def update(self, key, day_rollups):
+        """Store closed day rollups."""
+        days = self.rollups.setdefault(key, {})
+        stored = 0
+        for day in day_rollups:
+            if not day.situations or day.last is None:
+                continue
+            days[day.date.isoformat()] = day.dump()
+            stored += 1
+        if stored:
+            self.dump()
+            log.info('Stored %s day rollups', stored)
+
+    def invalidate(self, when, until=None):
+        """Drop all days, which may be changed by an event at that time.
+
+        :param when: UTC epoch microseconds.
+        :param until: UTC epoch microseconds to drop all days, which may be
+            changed by events between `when` and `until`.
+        """
+        until = when if until is None else until
+        invalid = 0
+        for days in self.rollups.values():
+            for date in [date for date, (*_, first, last) in days.items()
+                         if (first is None or first <= until)
+                         and when <= last]:
+                del days[date]
+                invalid += 1
+        if invalid:
+            self.dump()
+
+    def clear(self):
+        if self.rollups:
+            self.rollups.clear()
+            self.dump()
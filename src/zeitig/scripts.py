@@ -19,11 +19,13 @@ z [<group>] work [<when>] [-t <tag> ...] [-n <note>]
 z [<group>] break [<when>] [-t <tag> ...] [-n <note>]
 z [<group>] add [<when>] [-t <tag> ...] [-n <note>]
 z [<group>] remove [<when>] [-t <tag> ...] [-n]
+z [<group>] import [-f jsonl|csv] [<file>]
 
 reports
 =======
 
-z [<group>] report
+z [<group>] report [--all-groups] [-o <file>]
+z [<group>] export [-f jsonl|csv] [--events] [--all-groups] [-o <file>]
 
 
 templates
@@ -31,6 +33,7 @@ templates
 
 z [<group>] template defaults get
 z [<group>] template defaults set - <file>
+z [<group>] template compile
 
 
 maintaining
@@ -38,17 +41,19 @@ maintaining
 
 z [<group>] maintain undo
 z [<group>] maintain list
+z [<group>] maintain pack
 
 """
 import logging
 import re
 
 import click
-import crayons
 import pendulum
 import qtoml
 
-from . import events, reporting, sourcing, store, utils
+# reporting and sourcing are imported by the commands using them, so that
+# `z work` and `z break` start fast
+from . import events, store, utils
 
 log = logging.getLogger(__name__)
 
@@ -93,7 +98,7 @@ class PendulumLocal(click.ParamType):
 
     def convert(self, value, param, ctx):
         try:
-            p = pendulum.parse(value, tz=events.local_timezone)
+            p = pendulum.parse(value, tz=events.get_local_timezone())
             return p
         except:
             self.fail(f'`{value}` is not a valid timestamp string',
@@ -114,8 +119,11 @@ def cli(ctx, group):
         'now': now,
         'store': ev_store
     })
+    ctx.call_on_close(ev_store.flush)
 
     if ctx.invoked_subcommand is None:
+        from . import reporting
+
         state = reporting.State(ev_store)
         state.print(cli.get_help(ctx))
 
@@ -204,6 +212,35 @@ def cli_remove(obj, tags, note, when):
     click.echo(event)
 
 
+@cli.command('import')
+@click.option('-f', '--format', type=click.Choice(['jsonl', 'csv']),
+              help='The format of the events, guessed by the file extension.')
+@click.option('-b', '--batch-size', type=int,
+              default=store.IMPORT_BATCH_SIZE,
+              help='The number of events written at once.')
+@click.argument('file', type=click.File('r'), default='-')
+@click.pass_obj
+def cli_import(obj, format, batch_size, file):
+    """Import events from JSON lines or CSV.
+
+    Every line of JSON or row of CSV with the columns `type`, `when`, `tags`
+    and `note` is an event. Tags in CSV are separated by commas, times without
+    an offset are local times.
+    """
+    import crayons
+    from . import importing
+
+    format = format or importing.guess_format(file.name)
+    try:
+        count = obj.store.persist_many(
+            importing.iter_events(file, format=format),
+            batch_size=batch_size)
+    except importing.ImportException as ex:
+        click.echo(crayons.red(f'{ex.__class__.__name__}: {ex}'))
+        exit(1)
+    click.echo(f'Imported {count} events')
+
+
 class Round(click.ParamType):
     name = 'round'
     re_round = re.compile(r'(?P<size>\d+)(?P<unit>s|m|h)?')
@@ -233,16 +270,62 @@ class Round(click.ParamType):
               help='A template to render the report.')
 @click.option('-r', '--round', type=Round(),
               help='Round situation start and end to blocks of this size.')
+@click.option('-a', '--all-groups', is_flag=True,
+              help='Report the situations of all groups.')
+@click.option('-o', '--output', type=click.File('w'), default='-',
+              help='Write the report to this file.')
 @click.pass_obj
-def cli_report(obj, start, end, template, round):
+def cli_report(obj, start, end, template, round, all_groups, output):
     """Create a report of your events."""
+    import asyncio
+    from . import reporting
+
     end = (end or obj['now']).in_tz('UTC')
-    report = reporting.Report(obj.store, start=start, end=end, round=round)
+    report = reporting.Report(obj.store, start=start, end=end, round=round,
+                              all_groups=all_groups)
+    loop = asyncio.new_event_loop()
     try:
-        report.print(template_name=template)
+        loop.run_until_complete(
+            report.print_async(template_name=template, file=output))
     except reporting.ReportTemplateNotFound:
         click.echo(click.style(f'Template not found: {template}', fg='red'))
         exit(1)
+    finally:
+        loop.close()
+
+
+@cli.command('export')
+@click.option('-s', '--start', type=PendulumLocal())
+@click.option('-e', '--end', type=PendulumLocal())
+@click.option('-f', '--format', type=click.Choice(['jsonl', 'csv']),
+              default='jsonl', help='The format of the rows.')
+@click.option('-r', '--round', type=Round(),
+              help='Round situation start and end to blocks of this size.')
+@click.option('--events', 'raw_events', is_flag=True,
+              help='Export the events instead of the situations.')
+@click.option('-a', '--all-groups', is_flag=True,
+              help='Export the situations or events of all groups.')
+@click.option('-o', '--output', type=click.File('w'), default='-',
+              help='Write the rows to this file.')
+@click.pass_obj
+def cli_export(obj, start, end, format, round, raw_events, all_groups,
+               output):
+    """Stream your situations or events as JSON lines or CSV."""
+    import os
+    import sys
+    from . import exporting
+
+    end = (end or obj['now']).in_tz('UTC')
+    export = exporting.Export(obj.store, start=start, end=end, round=round,
+                              all_groups=all_groups,
+                              situations=not raw_events)
+    try:
+        export.write(output, format=format)
+        output.flush()
+    except BrokenPipeError:
+        # the reader of the pipe has gone, so python must not flush again
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        exit(1)
 
 
 @cli.group('template')
@@ -259,6 +342,8 @@ def cli_template_defaults():
 @click.pass_obj
 def cli_template_defaults_get(obj):
     """Show the actual template defaults for this user or group."""
+    from . import reporting
+
     templates = reporting.Templates(obj.store)
     defaults_file_path = (templates.group_defaults_file_path
                           if obj.store.group
@@ -273,6 +358,9 @@ def cli_template_defaults_get(obj):
 @click.pass_obj
 def cli_template_defaults_set(obj, defaults):
     """Set the template defaults for this user or group."""
+    import crayons
+    from . import reporting
+
     data = defaults.read()
     try:
         qtoml.loads(data)
@@ -292,11 +380,28 @@ def cli_template_defaults_set(obj, defaults):
 @click.pass_obj
 def cli_template_defaults_join(obj):
     """Show the joined actual template defaults."""
+    from . import reporting
+
     templates = reporting.Templates(obj.store)
     defaults = templates.join_template_defaults()
     click.echo(qtoml.dumps(defaults))
 
 
+@cli_template.command('compile')
+@click.pass_obj
+def cli_template_compile(obj):
+    """Precompile all templates, so reports skip parsing them.
+
+    Templates changed later are compiled from source again, until the next
+    compile.
+    """
+    from . import reporting
+
+    templates = reporting.Templates(obj.store)
+    for name in templates.compile_templates():
+        click.echo(f'Compiled {name}')
+
+
 @cli.group('maintain')
 def cli_maintain():
     """Maintaining commands."""
@@ -306,11 +411,13 @@ def cli_maintain():
 @click.pass_obj
 def cli_maintain_list(obj):
     """Show the list of events sorted by creation time."""
+    from . import sourcing
+
     sourcerer = sourcing.Sourcerer(obj.store)
 
-    for event_path, event_stat in obj.store.iter_names_created():
-        event_ctime = pendulum.from_timestamp(event_stat.st_ctime, tz='UTC')
-        event = sourcerer.load_event(store.EventSource(event_path.name))
+    for location in obj.store.iter_names_created():
+        event_ctime = pendulum.from_timestamp(location.created, tz='UTC')
+        event = sourcerer.load_event(location.name)
         click.echo(f'{event_ctime} {event}')
 
 
@@ -318,16 +425,29 @@ def cli_maintain_list(obj):
 @click.pass_obj
 def cli_maintain_undo(obj):
     """Undo the last event."""
-    last_event_path, last_event_stat = \
-        next(reversed(obj.store.iter_names_created()), (None, None))
-    if last_event_path:
+    import crayons
+    from . import sourcing
+
+    last_location = obj.store.last_location()
+    if last_location:
         sourcerer = sourcing.Sourcerer(obj.store)
-        event = sourcerer.load_event(store.EventSource(last_event_path.name))
+        event = sourcerer.load_event(last_location.name)
 
         click.echo(crayons.yellow(f'Undoing event: {event}'))
-        click.echo(f'Location: {last_event_path}')
+        click.echo(f'Location: {last_location.path}')
         click.echo()
         click.echo(qtoml.dumps(dict(event.source())))
 
         if click.confirm('Are you sure?'):
-            last_event_path.unlink()
+            obj.store.remove(last_location.name)
+
+
+@cli_maintain.command('pack')
+@click.pass_obj
+def cli_maintain_pack(obj):
+    """Move all event files into monthly segment files.
+
+    From then on new events are appended to the segments.
+    """
+    packed = obj.store.pack()
+    click.echo(f'Packed {packed} events into {obj.store.segments.path}')
@@ -0,0 +1,214 @@
+# Copyright 2018 Oliver Berger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Append-only segment log storage.
+
+Instead of a single file per event, events are appended to a segment file per
+month. Every record is length prefixed::
+
+    <created: double> <name length: ushort> <payload length: uint>
+    <name> <payload>
+
+The name is the UTC timestamp of the event, the payload its serialized source.
+A later record with the same name supersedes an earlier one. A record torn
+by a crash is cut off before the next append.
+"""
+import collections
+import logging
+import os
+import struct
+import time
+
+log = logging.getLogger(__name__)
+
+RECORD_HEADER = struct.Struct('>dHI')
+
+Record = collections.namedtuple('Record', 'name created payload')
+
+
+def segment_name(name):
+    """The segment of an event is the month of its UTC timestamp."""
+    return name[:7]
+
+
+def encode_record(name, created, payload):
+    name = name.encode('utf-8')
+    return RECORD_HEADER.pack(created, len(name), len(payload))\
+        + name + payload
+
+
+def decode_records(data):
+    """Generate all records of a segment."""
+    offset, size = 0, len(data)
+    while offset < size:
+        if offset + RECORD_HEADER.size > size:
+            log.warning('Truncated record header at %s', offset)
+            break
+        created, name_size, payload_size = \
+            RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        if offset + name_size + payload_size > size:
+            log.warning('Truncated record at %s', offset)
+            break
+        name = data[offset:offset + name_size].decode('utf-8')
+        offset += name_size
+        payload = data[offset:offset + payload_size]
+        offset += payload_size
+        yield Record(name, created, payload)
+
+
+def valid_size(data):
+    """The size of the complete records at the start of a segment."""
+    offset, size = 0, len(data)
+    while offset + RECORD_HEADER.size <= size:
+        _, name_size, payload_size = RECORD_HEADER.unpack_from(data, offset)
+        end = offset + RECORD_HEADER.size + name_size + payload_size
+        if end > size:
+            break
+        offset = end
+    return offset
+
+
+class SegmentLog:
+
+    """Store event sources in a few append-only segment files."""
+
+    def __init__(self, path):
+        self.path = path
+        self.segments = {}
+        # the sizes of segments known to end with a complete record
+        self.sizes = {}
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.path}>'
+
+    def segment_path(self, segment):
+        return self.path.joinpath(segment)
+
+    def iter_segments(self):
+        return sorted(path.name for path in self.path.iterdir()
+                      if path.is_file() and not path.name.startswith('.'))
+
+    def read_segment(self, segment):
+        """Read a whole segment sequentially and map its records by name."""
+        try:
+            return self.segments[segment]
+        except KeyError:
+            records = collections.OrderedDict()
+            path = self.segment_path(segment)
+            if path.is_file():
+                with path.open('rb') as segment_file:
+                    data = segment_file.read()
+                for record in decode_records(data):
+                    records[record.name] = record
+                if valid_size(data) == len(data):
+                    self.sizes[segment] = len(data)
+            self.segments[segment] = records
+            return records
+
+    def names(self):
+        """All event names stored in the segments."""
+        return [name for segment in self.iter_segments()
+                for name in self.read_segment(segment)]
+
+    def records(self):
+        """All records stored in the segments."""
+        return [record for segment in self.iter_segments()
+                for record in self.read_segment(segment).values()]
+
+    def __contains__(self, name):
+        return name in self.read_segment(segment_name(name))
+
+    def record(self, name):
+        return self.read_segment(segment_name(name))[name]
+
+    def read(self, name):
+        """Return the payload of the event."""
+        return self.record(name).payload
+
+    def location(self, name):
+        return self.segment_path(segment_name(name))
+
+    def repair(self, segment):
+        """Cut off a torn record at the end of a segment.
+
+        :returns: the size of the segment.
+        """
+        path = self.segment_path(segment)
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return 0
+        if self.sizes.get(segment) != size:
+            with path.open('r+b') as segment_file:
+                valid = valid_size(segment_file.read())
+                if valid < size:
+                    log.warning('Cutting off a torn record of %s at %s',
+                                path, valid)
+                    segment_file.truncate(valid)
+            size = self.sizes[segment] = valid
+        return size
+
+    def _write(self, segment, data, sync=False):
+        size = self.repair(segment)
+        with self.segment_path(segment).open('ab') as segment_file:
+            segment_file.write(data)
+            if sync:
+                segment_file.flush()
+                os.fsync(segment_file.fileno())
+        self.sizes[segment] = size + len(data)
+
+    def append(self, name, payload, created=None):
+        """Append a record to its segment."""
+        record = Record(name, time.time() if created is None else created,
+                        payload)
+        segment = segment_name(name)
+        records = self.read_segment(segment)
+        self._write(segment, encode_record(*record))
+        records.pop(name, None)
+        records[name] = record
+
+    def append_many(self, items):
+        """Append many records and sync every touched segment once.
+
+        The records of the touched segments are read again on demand, so
+        they are not kept in memory.
+
+        :param items: names, payloads and creation times, which may be
+            `None` for now.
+        """
+        now = time.time()
+        by_segment = collections.defaultdict(list)
+        for name, payload, created in items:
+            by_segment[segment_name(name)].append(encode_record(
+                name, now if created is None else created, payload))
+        for segment, records in by_segment.items():
+            self._write(segment, b''.join(records), sync=True)
+            self.segments.pop(segment, None)
+
+    def remove(self, name):
+        """Rewrite the segment without the event."""
+        segment = segment_name(name)
+        records = self.read_segment(segment)
+        if records.pop(name, None) is None:
+            raise KeyError(name)
+        self.sizes.pop(segment, None)
+        path = self.segment_path(segment)
+        if not records:
+            path.unlink()
+            return
+        tmp_path = path.with_name(f'.{segment}.tmp')
+        with tmp_path.open('wb') as segment_file:
+            for record in records.values():
+                segment_file.write(encode_record(*record))
+        os.replace(str(tmp_path), str(path))
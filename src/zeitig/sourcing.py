@@ -11,17 +11,24 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import collections
+import concurrent.futures
 import logging
 
 import pendulum
 
-from . import events, utils
+from . import checkpoints, events, rollups, utils
 
 log = logging.getLogger(__name__)
 
 SITUATION = utils.adict(WORK='work', BREAK='break')
 ACTION = utils.adict(ADD='add', REMOVE='remove')
 
+# threads reading and decoding events ahead of `Sourcerer.generate`
+PREFETCH_WORKERS = 4
+# the maximal number of events read ahead
+PREFETCH_SIZE = 64
+
 
 class Sourcerer:
 
@@ -31,41 +38,99 @@ class Sourcerer:
     but let lazy applied tags and notes take effect.
     """
 
-    events = {}
-
-    def __init__(self, store):
+    def __init__(self, store, *, workers=PREFETCH_WORKERS,
+                 prefetch=PREFETCH_SIZE):
         self.store = store
+        # the cache is shared by all sourcerers of the store
+        self.events = store.event_cache
+        self.workers = workers
+        self.prefetch = prefetch
+
+    def load_event(self, name, *, when=None):
+        """Load an event by name.
 
-    def load_event(self, link):
+        :param when: the expected epoch microseconds of the event.
+        """
         try:
-            return self.events[link]
+            return self.events[name]
         except KeyError:
-            event = self.store.load(link.name)
-            assert event.when == link.when, 'Do not mess with the files!'
-            self.events[link] = event
-            return event
+            return self._cache_event(name, self.store.load(name), when)
+
+    def _cache_event(self, name, event, when):
+        assert when is None or utils.epoch_micros(event.when) == when,\
+            'Do not mess with the files!'
+        self.events[name] = event
+        return event
+
+    def iter_events(self, timeline, start, stop):
+        """Load the events between two positions of the timeline in order.
+
+        Events, which are not cached yet, are read ahead by a thread pool, but
+        not more than `prefetch` at once.  They are decoded in this thread.
+        """
+        positions = iter(range(start, stop))
+        if self.workers < 2 or self.prefetch < 1:
+            for position in positions:
+                name, when = timeline.name(position), timeline.when(position)
+                yield self.load_event(name, when=when)
+            return
+
+        # the first event is loaded in this thread, so the lazy attributes
+        # of the store are set up, before the threads share them
+        for position in positions:
+            name, when = timeline.name(position), timeline.when(position)
+            cached = name in self.events
+            yield self.load_event(name, when=when)
+            if not cached:
+                break
+
+        pending = collections.deque()
+        executor = concurrent.futures.ThreadPoolExecutor(self.workers)
+        try:
+            for position in positions:
+                name, when = timeline.name(position), timeline.when(position)
+                future = None if name in self.events\
+                    else executor.submit(self.store.fetch, name)
+                pending.append((name, when, future))
+                if len(pending) >= self.prefetch:
+                    yield self._resolve(*pending.popleft())
+            while pending:
+                yield self._resolve(*pending.popleft())
+        finally:
+            for _, _, future in pending:
+                if future is not None:
+                    future.cancel()
+            executor.shutdown()
+
+    def _resolve(self, name, when, future):
+        if future is None:
+            # the event may have been dropped from the cache meanwhile
+            return self.load_event(name, when=when)
+        return self._cache_event(name, future.result()(), when)
 
     def generate(self, *, start=None, end=None, round=None):
         """Generate all intervals within this time frame."""
+        timeline = self.store.iter_names()
+        position = timeline.bisect(utils.epoch_micros(start))\
+            if start else 0
+        stop = timeline.bisect(utils.epoch_micros(end))\
+            if end else len(timeline)
         current_situation = None
-        for link in self.store.iter_names():
-            log.debug('Found event source: %s', link)
-            if start and link.when < start:
-                continue
-            if end and link.when >= end:
-                # finish situation
-                break
+        for position, event in enumerate(
+                self.iter_events(timeline, position, stop), position):
+            when = timeline.when(position)
+            log.debug('Found event source: %s', timeline.name(position))
 
             # find first event
-            event = self.load_event(link)
             if current_situation is None:
-                if (not start or start == link.when)\
+                if (not start or utils.epoch_micros(start) == when)\
                         and isinstance(event, events.SituationEvent):
                     current_situation = event.create_situation(round=round)
                     continue
                 else:
                     # assemble state of first event
-                    current_situation = self._find_situation_before(link)
+                    current_situation = self._find_situation_before(
+                        timeline, position)
                     # trim to fit start
                     current_situation.start = start
             # apply events
@@ -84,25 +149,147 @@ class Sourcerer:
                 current_situation.end = end
             yield current_situation
 
-    def _find_situation_before(self, link, round=None):
+    def situation_at(self, when, *, round=None):
+        """The situation at that time with its real start.
+
+        Its start is `None`, if it started before all events.
         """
-        :param link: the store link from where we start to search.
+        timeline = self.store.iter_names()
+        micros = utils.epoch_micros(when)
+        position = timeline.bisect(micros)
+        if position < len(timeline) and timeline.when(position) == micros:
+            event = self.load_event(timeline.name(position), when=micros)
+            if isinstance(event, events.SituationEvent):
+                return event.create_situation(round=round)
+        return self._find_situation_before(timeline, position, round=round)
+
+    def current_situation(self):
+        """The situation after the latest event or `None` without events.
+
+        It is kept in the head of the store and only sourced, if the head
+        does not know it.
         """
-        before = None
-        for before in link.before():
-            event = self.load_event(before)
+        group_head = self.store.fresh_head()
+        situation = group_head.situation
+        if situation is None:
+            timeline = self.store.iter_names()
+            if not len(timeline):
+                return None
+            situation = self._find_situation_before(timeline, len(timeline))
+            group_head.set_situation(timeline.when(len(timeline) - 1),
+                                     situation)
+        situation.is_last = True
+        return situation
+
+    def generate_days(self, *, start=None, end=None, round=None, tz=None):
+        """Generate the `rollups.DayRollup` of every local day in this frame.
+
+        Closed whole days are taken from the rollups of the store, all other
+        days are sourced and stored, if they are closed.
+        """
+        tz = tz if tz is not None else events.get_local_timezone()
+        timeline = self.store.iter_names()
+        if not len(timeline):
+            return
+        start = start.in_tz(tz) if start else utils.from_epoch_micros(
+            timeline.when(0)).in_tz(tz).start_of('day')
+        end = (end or utils.utcnow()).in_tz(tz)
+        key = rollups.rollup_key(tz, round)
+
+        missing = []
+        date = start.date()
+        while date <= end.date():
+            day_start = pendulum.datetime(date.year, date.month, date.day,
+                                          tz=tz)
+            day_end = day_start.add(days=1)
+            whole = start <= day_start and day_end <= end
+            rollup = self.store.rollups.get(key, date) if whole else None
+            if rollup is None:
+                if day_start < end:
+                    missing.append((date, max(start, day_start),
+                                    min(end, day_end), whole))
+            else:
+                yield from self._rollup_days(missing, round, tz, key)
+                missing = []
+                yield rollup
+            date = date.add(days=1)
+        yield from self._rollup_days(missing, round, tz, key)
+
+    def _rollup_days(self, days, round, tz, key):
+        """Source a run of consecutive days and store the closed whole ones.
+
+        :param days: a list of local dates with their start, end and if they
+            are whole days.
+        """
+        if not days:
+            return
+        _, run_start, _, run_whole = days[0]
+        _, _, run_end, _ = days[-1]
+        day_rollups = {date: rollups.DayRollup(date) for date, *_ in days}
+        bounds = {date: (day_start, day_end)
+                  for date, day_start, day_end, _ in days}
+        # source from the real start of the first situation to know all
+        # events affecting the first day, nothing is before all events
+        before = self.situation_at(run_start, round=round).start
+        origin = before if before is None or run_whole else run_start
+        for i, situation in enumerate(self.generate(
+                start=origin, end=run_end, round=round)):
+            if situation.start is None:
+                continue
+            # any earlier event may change a situation cut at the start or
+            # following the first events
+            first = None if i == 0 and (origin is None or not run_whole)\
+                else situation._start
+            last = None if situation.is_last else situation._end
+            situation.tz = tz
+            for piece in situation.split_local_overnight():
+                date = piece.local_start.date()
+                if date not in day_rollups:
+                    continue
+                day_start, day_end = bounds[date]
+                micros = utils.epoch_micros(min(piece.local_end, day_end))\
+                    - utils.epoch_micros(max(piece.local_start, day_start))
+                day_rollups[date].add_situation(
+                    piece, max(micros, 0), first, last)
+        self.store.rollups.update(key, [
+            day_rollups[date] for date, _, _, whole in days if whole])
+        yield from day_rollups.values()
+
+    async def generate_async(self, *, start=None, end=None, round=None):
+        """Generate all intervals within this time frame asynchronously.
+
+        The events are sourced in a thread ahead of the consumer.
+        """
+        async for situation in utils.iterate_async(
+                self.generate(start=start, end=end, round=round),
+                maxsize=self.prefetch):
+            yield situation
+
+    def _find_situation_before(self, timeline, position, round=None):
+        """
+        :param timeline: the timeline of the store.
+        :param position: the position from where we start to search.
+        """
+        for before in range(position - 1, -1, -1):
+            name = timeline.name(before)
+            situation = self.store.checkpoints.get(name, round=round)
+            if situation is not None:
+                break
+            event = self.load_event(name, when=timeline.when(before))
             if isinstance(event, events.SituationEvent):
                 situation = event.create_situation(round=round)
-                # switch to next before
-                before = before.next
                 break
         else:
             # default situation is a break
             situation = events.Break()
-        # apply events to situation until link
-        while before and before is not link:
-            event = self.load_event(before)
+            before = -1
+        # apply events to situation until position
+        replayed = range(before + 1, position)
+        for before in replayed:
+            event = self.load_event(timeline.name(before),
+                                    when=timeline.when(before))
             event.apply_to_situation(situation)
-            before = before.next
 
+        if len(replayed) >= checkpoints.CHECKPOINT_INTERVAL:
+            self.store.checkpoints.set(timeline.name(position - 1), situation)
         return situation
@@ -11,21 +11,31 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import collections
+import functools
 import getpass
 import itertools
 import logging
+import operator
 import os
 import pathlib
+import time
 
-import pendulum
 import qtoml
 
-from . import events, utils
+from . import (cache, checkpoints, events, head, index, rollups, segments,
+               utils)
 
 log = logging.getLogger(__name__)
 
 CONFIG_NAME = '.zeitig'
 SOURCE_NAME = 'source'
+SEGMENTS_NAME = 'segments'
+INDEX_NAME = 'index'
+CHECKPOINTS_NAME = 'checkpoints.toml'
+ROLLUPS_NAME = 'rollups'
+HEAD_NAME = 'head.toml'
+CACHE_PATH_NAME = 'cache'
 GROUPS_NAME = 'groups'
 LAST_NAME = 'last'
 DEFAULT_CONFIG_PATHS = [pathlib.Path(p).expanduser() for p in (
@@ -33,12 +43,54 @@ DEFAULT_CONFIG_PATHS = [pathlib.Path(p).expanduser() for p in (
     '~/.config/zeitig',
 )]
 CONFIG_STORE_ENV_NAME = 'ZEITIG_STORE'
+EVENT_CACHE_SIZE = 10000
+EVENT_CACHE_BYTES = 64 * 1024 * 1024
+IMPORT_BATCH_SIZE = 1000
 
 
 class LastPathNotSetException(Exception):
     pass
 
 
+EventLocation = collections.namedtuple('EventLocation', 'name created path')
+
+
+def source_group(store_path, group, start=None, end=None, round=None):
+    """Source all situations of a group and tag them with the group.
+
+    This runs in a worker process of `Store.source_groups`.
+    """
+    from . import sourcing
+
+    group_store = Store(store_path=store_path, group=group)
+    situations = list(sourcing.Sourcerer(group_store).generate(
+        start=start, end=end, round=round))
+    group_store.flush()
+    for situation in situations:
+        situation.group = group
+    return situations
+
+
+def source_group_days(store_path, group, start=None, end=None, round=None,
+                      tz=None):
+    """Source the day rollups of a group.
+
+    This runs in a worker process of `Store.source_groups_days`.
+    """
+    from . import sourcing
+
+    group_store = Store(store_path=store_path, group=group)
+    days = list(sourcing.Sourcerer(group_store).generate_days(
+        start=start, end=end, round=round, tz=tz))
+    group_store.flush()
+    return days
+
+
+def situation_start(situation):
+    start = situation.start
+    return (start is not None, start)
+
+
 def find_config_store(cwd=None):
     """Find the config store base directory."""
     config_path = os.environ.get(CONFIG_STORE_ENV_NAME)
@@ -67,71 +119,6 @@ def find_config_store(cwd=None):
         return config_path
 
 
-class Link:
-    def __init__(self):
-        self.previous = None
-        self.next = None
-
-    def before(self):
-        if self.previous:
-            yield self.previous
-            yield from self.previous.before()
-
-    def after(self):
-        if self.next:
-            yield self.next
-            yield from self.next.after()
-
-    def __iter__(self):
-        return iter(self.after())
-
-    @property
-    def head(self):
-        """Find the last element."""
-        current = self
-        while current.next:
-            current = current.next
-        return current
-
-    @property
-    def root(self):
-        """Find the first element."""
-        current = self
-        while current.previous:
-            current = current.previous
-        return current
-
-    def insert(self, next):
-        """Insert a next chain after this link."""
-        if self.next is not None:
-            self.next.previous, next.next = next, self.next
-        next.previous, self.next = self, next
-
-    @classmethod
-    def from_sequence(cls, seq):
-        previous = None
-        for item in seq:
-            src = cls(item)
-            if previous:
-                previous.insert(src)
-            yield src
-            previous = src
-
-
-class EventSource(Link):
-    def __init__(self, name):
-        super().__init__()
-        self.name = name
-
-    @utils.reify
-    def when(self):
-        when = pendulum.parse(self.name).in_tz('UTC')
-        return when
-
-    def __repr__(self):
-        return f'<{self.__class__.__name__} {self.when}>'
-
-
 class Store:
 
     """Handle persisting and loading of event sources.
@@ -151,23 +138,129 @@ class Store:
 
     user = getpass.getuser()
 
-    def __init__(self, store_path=None, group=None):
+    def __init__(self, store_path=None, group=None, *,
+                 cache_size=EVENT_CACHE_SIZE, cache_bytes=EVENT_CACHE_BYTES):
         self.store_path = store_path if store_path else find_config_store()
         self.group = group
+        self.cache_size = cache_size
+        self.cache_bytes = cache_bytes
 
     def __repr__(self):
         return f'{self.__class__.__name__}: {self.store_path} [{self.group}]'
 
     def iter_names_created(self):
-        """The list of event paths sorted after creation time."""
-        paths = sorted(((x, x.stat()) for x in self.source_path.iterdir()),
-                       key=lambda x: (x[1].st_ctime, x[1].st_mtime, x[0].name))
-        return paths
+        """The list of event locations sorted after creation time."""
+        locations = [
+            EventLocation(path.name, stat.st_ctime, path)
+            for path, stat in ((x, x.stat())
+                               for x in self.source_path.iterdir())
+        ]
+        if self.segments is not None:
+            locations.extend(
+                EventLocation(record.name, record.created,
+                              self.segments.location(record.name))
+                for record in self.segments.records()
+            )
+        locations.sort(key=lambda x: (x.created, x.name))
+        return locations
+
+    def last_location(self):
+        """The location of the last created event or `None`.
+
+        It is kept in the head of the group, so all events are only looked
+        at, if the head is missing.
+        """
+        group_head = self.fresh_head()
+        if group_head.name is None:
+            location = next(reversed(self.iter_names_created()), None)
+            if location is not None:
+                group_head.set_last(location.name, location.created)
+            return location
+        return EventLocation(group_head.name, group_head.created,
+                             self.location(group_head.name))
+
+    def list_names(self):
+        """Collect all event names of the group."""
+        names = set(map(lambda x: x.name, self.source_path.iterdir()))
+        if self.segments is not None:
+            names.update(self.segments.names())
+        return sorted(names)
 
     def iter_names(self):
-        """Create a double linked list of all event dates."""
-        paths = sorted(map(lambda x: x.name, self.source_path.iterdir()))
-        return EventSource.from_sequence(paths)
+        """The timeline of all events."""
+        return self.fresh_timestamp_index()
+
+    @utils.reify
+    def event_cache(self):
+        """The loaded events of this group."""
+        return utils.LRUCache(maxsize=self.cache_size,
+                              maxbytes=self.cache_bytes)
+
+    @utils.reify
+    def cache_path(self):
+        path = self.store_path.joinpath(CACHE_PATH_NAME)
+        if not path.is_dir():
+            path.mkdir()
+        return path
+
+    @utils.reify
+    def source_cache(self):
+        """The decoded event sources of this group."""
+        # not needed to persist events
+        import hashlib
+
+        key = hashlib.sha1(str(self.group_path).encode('utf-8'))\
+            .hexdigest()
+        return cache.EventSourceCache(
+            self.cache_path.joinpath(f'events-{key}'))
+
+    def flush(self):
+        """Write all pending caches."""
+        if 'source_cache' in self.__dict__:
+            self.source_cache.dump(self.fresh_timestamp_index())
+
+    @utils.reify
+    def timestamp_index(self):
+        return index.TimestampIndex(self.group_path.joinpath(INDEX_NAME),
+                                    sources=self.iter_index_sources)
+
+    def iter_index_sources(self):
+        """All paths, whose modification invalidates the index."""
+        yield self.source_path
+        if self.segments is not None:
+            yield self.segments.path
+            yield from map(self.segments.segment_path,
+                           self.segments.iter_segments())
+
+    def fresh_timestamp_index(self):
+        """Return the index and rebuild it, if it is outdated."""
+        if not self.timestamp_index.is_fresh():
+            self.timestamp_index.rebuild(self.list_names())
+            # we do not know what has changed
+            self.checkpoints.clear()
+            self.rollups.clear()
+            self.event_cache.clear()
+        return self.timestamp_index
+
+    @utils.reify
+    def head(self):
+        return head.Head(self.group_path.joinpath(HEAD_NAME),
+                         sources=self.iter_index_sources)
+
+    def fresh_head(self):
+        """Return the head and clear it, if events were touched by hand."""
+        if not self.head.is_fresh():
+            self.head.clear()
+        return self.head
+
+    @utils.reify
+    def checkpoints(self):
+        return checkpoints.Checkpoints(
+            self.group_path.joinpath(CHECKPOINTS_NAME))
+
+    @utils.reify
+    def rollups(self):
+        return rollups.Rollups(self.group_path.joinpath(ROLLUPS_NAME))
 
     @utils.reify
     def user_path(self):
@@ -196,6 +289,14 @@ class Store:
             source_path.mkdir(parents=True)
         return source_path
 
+    @utils.reify
+    def segments(self):
+        """The segment log of the group, if the group was packed."""
+        segments_path = self.group_path.joinpath(SEGMENTS_NAME)
+        if segments_path.is_dir():
+            return segments.SegmentLog(segments_path)
+        return None
+
     @utils.reify
     def last_path(self):
         last_path = self.user_path.joinpath(LAST_NAME)
@@ -216,8 +317,7 @@ class Store:
             pass
         else:
             if last_path.exists():
-                last_name = last_path.name
-                return EventSource(last_name)
+                return last_path.name
 
     @utils.reify
     def groups(self):
@@ -228,17 +328,163 @@ class Store:
                   if dir.is_dir()]
         return groups
 
+    def source_groups(self, *, start=None, end=None, round=None,
+                      groups=None, processes=None):
+        """Source the situations of several groups concurrently.
+
+        Every group is sourced by a process pool and the situations are
+        merged into one stream ordered by their start.
+
+        :param groups: the groups to source, all groups by default.
+        :param processes: the size of the process pool, `1` sources all
+            groups in this process.
+        """
+        import heapq
+
+        streams = self._map_groups(source_group, groups, processes,
+                                   start, end, round)
+        return heapq.merge(*streams, key=situation_start)
+
+    def source_groups_days(self, *, start=None, end=None, round=None,
+                           tz=None, groups=None, processes=None):
+        """Generate the day rollups of several groups joined per local date.
+
+        The groups are sourced like by `source_groups`.
+        """
+        import heapq
+
+        streams = self._map_groups(source_group_days, groups, processes,
+                                   start, end, round, tz)
+        days = heapq.merge(*streams, key=operator.attrgetter('date'))
+        for _, day_rollups in itertools.groupby(
+                days, key=operator.attrgetter('date')):
+            yield rollups.DayRollup.merge(list(day_rollups))
+
+    def _map_groups(self, function, groups, processes, *args):
+        """Call a function with the store path, every group and the args."""
+        # the process pool is slow to import and only used by reports
+        import concurrent.futures
+
+        groups = sorted(self.groups if groups is None else groups)
+        args = (itertools.repeat(self.store_path), groups,
+                *map(itertools.repeat, args))
+        if processes == 1 or len(groups) < 2:
+            return list(map(function, *args))
+        with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+            return list(executor.map(function, *args))
+
     def persist(self, event):
         """Store the event."""
-        event_path = self.source_path.joinpath(
-            str(event.when)
-        )
+        name = str(event.when)
         source = dict(event.source())
-        with event_path.open('w') as event_file:
-            qtoml.dump(source, event_file)
+        index_is_fresh = self.timestamp_index.is_fresh()
+        group_head = self.fresh_head()
+        if self.segments is not None:
+            self.segments.append(name, qtoml.dumps(source).encode('utf-8'))
+        else:
+            event_path = self.source_path.joinpath(name)
+            with event_path.open('w') as event_file:
+                qtoml.dump(source, event_file)
+        if index_is_fresh:
+            self.timestamp_index.insert(name)
+        self.checkpoints.invalidate(name)
+        self.rollups.invalidate(utils.epoch_micros(event.when))
+        group_head.update(name, event, time.time())
+        self.event_cache.pop(name, None)
         log.info('Persisted event: %s', source)
         self.link_last_path()
 
+    def persist_many(self, new_events, batch_size=IMPORT_BATCH_SIZE):
+        """Store a lot of events in batches.
+
+        Every batch is flushed to disk by a single sync of its directory and
+        only the caches a batch may change are invalidated. The head and the
+        last path are updated once, even if the events are interrupted by an
+        exception. Batches stored before stay stored.
+
+        :returns: the number of stored events.
+        """
+        index_is_fresh = self.timestamp_index.is_fresh()
+        group_head = self.fresh_head()
+        count, last_name = 0, None
+        try:
+            for batch in utils.batched(new_events, batch_size):
+                items = [(str(event.when), dict(event.source()))
+                         for event in batch]
+                if self.segments is not None:
+                    self.segments.append_many(
+                        (name, qtoml.dumps(source).encode('utf-8'), None)
+                        for name, source in items)
+                    utils.fsync_dir(self.segments.path)
+                else:
+                    for name, source in items:
+                        with self.source_path.joinpath(name).open('w')\
+                                as event_file:
+                            qtoml.dump(source, event_file)
+                    utils.fsync_dir(self.source_path)
+                names = [name for name, _ in items]
+                if index_is_fresh:
+                    # out of order events rebuild the index once at the end
+                    index_is_fresh = self.timestamp_index.insert_many(names)
+                self.checkpoints.invalidate(min(names))
+                whens = [utils.epoch_micros(event.when) for event in batch]
+                self.rollups.invalidate(min(whens), max(whens))
+                for name in names:
+                    self.event_cache.pop(name, None)
+                count += len(items)
+                last_name = names[-1]
+                log.info('Persisted %s events', count)
+        finally:
+            if last_name is not None:
+                if not index_is_fresh:
+                    self.fresh_timestamp_index()
+                group_head.clear()
+                group_head.set_last(last_name, time.time())
+                self.link_last_path()
+        return count
+
+    def remove(self, name):
+        """Remove the event."""
+        index_is_fresh = self.timestamp_index.is_fresh()
+        group_head = self.fresh_head()
+        if self.segments is not None and name in self.segments:
+            self.segments.remove(name)
+        else:
+            self.source_path.joinpath(name).unlink()
+        if index_is_fresh:
+            self.timestamp_index.remove(name)
+        self.checkpoints.invalidate(name)
+        self.rollups.invalidate(utils.epoch_micros(utils.parse_utc(name)))
+        group_head.remove(name)
+        self.event_cache.pop(name, None)
+        log.info('Removed event: %s', name)
+
+    def location(self, name):
+        """The file containing the event."""
+        if self.segments is not None and name in self.segments:
+            return self.segments.location(name)
+        return self.source_path.joinpath(name)
+
+    def pack(self):
+        """Move all event files of the group into the segment log."""
+        segments_path = self.group_path.joinpath(SEGMENTS_NAME)
+        if not segments_path.is_dir():
+            segments_path.mkdir()
+        self.segments = segment_log = segments.SegmentLog(segments_path)
+        packed = 0
+        paths = sorted(self.source_path.iterdir(), key=lambda x: x.name)
+        for batch in utils.batched(paths, IMPORT_BATCH_SIZE):
+            # the files are only removed after their records were synced
+            segment_log.append_many(
+                (path.name, path.read_bytes(), path.stat().st_ctime)
+                for path in batch)
+            utils.fsync_dir(segments_path)
+            for path in batch:
+                path.unlink()
+            packed += len(batch)
+        log.info('Packed %s events into %s', packed, segments_path)
+        return packed
+
     def link_last_path(self):
         """Point last path to the actual group path."""
         if self.last_group != self.group:
@@ -262,7 +508,35 @@ class Store:
         return group_path
 
     def load(self, filename):
-        event_path = self.source_path.joinpath(filename)
-        with event_path.open('r') as event_file:
-            event = events.Event(**qtoml.load(event_file))
+        return self.fetch(filename)()
+
+    def fetch(self, filename):
+        """Read an event source without decoding it.
+
+        Only the reading is done here, so it may run in another thread.
+
+        :returns: a function to decode the event.
+        """
+        if self.segments is not None and filename in self.segments:
+            record = self.segments.record(filename)
+            validator = (record.created, len(record.payload))
+            source = self.source_cache.get(filename, validator)
+            text = record.payload.decode('utf-8') if source is None else None
+        else:
+            event_path = self.source_path.joinpath(filename)
+            stat = event_path.stat()
+            validator = (stat.st_mtime_ns, stat.st_size)
+            source = self.source_cache.get(filename, validator)
+            text = None
+            if source is None:
+                with event_path.open('r') as event_file:
+                    text = event_file.read()
+        return functools.partial(self._decode, filename, validator, source,
+                                 text)
+
+    def _decode(self, filename, validator, source, text):
+        if source is None:
+            source = qtoml.loads(text)
+            self.source_cache.set(filename, validator, source)
+        event = events.Event(**source)
         return event
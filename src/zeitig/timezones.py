@@ -0,0 +1,224 @@
+# Copyright 2018 Oliver Berger
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tables of the UTC offsets of a timezone.
+
+The offsets are sampled once a day and transitions are bisected to the
+microsecond, so local times, local days and their midnights are found by a
+binary search in UTC epoch microseconds.  The table grows by years on
+demand.
+"""
+import bisect
+import datetime
+import threading
+
+import pendulum
+
+from . import utils
+
+MICROS = 1000000
+DAY_MICROS = 86400 * MICROS
+YEAR_MICROS = 366 * DAY_MICROS
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+_TABLES = {}
+
+
+def offset_at(tz, micros):
+    """The UTC offset of the timezone at that time in microseconds."""
+    return utils.from_epoch_micros(micros).in_tz(tz).offset * MICROS
+
+
+def find_transitions(tz, start, end):
+    """Find all offset changes of the timezone between start and end.
+
+    :returns: the times since when an offset is valid and the offsets.
+    """
+    times, offsets = [start], [offset_at(tz, start)]
+    for day in range(start - start % DAY_MICROS + DAY_MICROS,
+                     end + DAY_MICROS, DAY_MICROS):
+        offset = offset_at(tz, day)
+        if offset != offsets[-1]:
+            # bisect the exact time of the transition
+            low, high = max(day - DAY_MICROS, times[-1]), day
+            while high - low > 1:
+                middle = low + (high - low) // 2
+                if offset_at(tz, middle) == offset:
+                    high = middle
+                else:
+                    low = middle
+            times.append(high)
+            offsets.append(offset)
+    return times, offsets
+
+
+def get_table(tz):
+    """The shared table of a timezone."""
+    if isinstance(tz, str):
+        tz = pendulum.timezone(tz)
+    try:
+        return _TABLES[tz]
+    except KeyError:
+        table = _TABLES[tz] = TransitionTable(tz)
+        return table
+
+
+class TransitionTable:
+
+    """The UTC offsets of a timezone.
+
+    :param tz: a `pendulum` timezone.
+    """
+
+    def __init__(self, tz):
+        self.tz = tz
+        # the UTC epoch microseconds since when an offset is valid, the
+        # offsets and the end of the table are replaced together, so threads
+        # read them without the lock
+        self._table = ([], [], None)
+        self._lock = threading.Lock()
+        self._midnights = {}
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.tz.name}>'
+
+    @property
+    def times(self):
+        return self._table[0]
+
+    @property
+    def offsets(self):
+        return self._table[1]
+
+    @property
+    def end(self):
+        return self._table[2]
+
+    @staticmethod
+    def _merge(times, offsets, more_times, more_offsets):
+        """Merge more transitions into new lists."""
+        entries = sorted(dict(zip(times + more_times,
+                                  offsets + more_offsets)).items())
+        times, offsets = [entries[0][0]], [entries[0][1]]
+        for time, offset in entries[1:]:
+            if offset != offsets[-1]:
+                times.append(time)
+                offsets.append(offset)
+        return times, offsets
+
+    def cover(self, start, end):
+        """Extend the table by whole years to cover start and end.
+
+        :returns: the times, the offsets and the end of the table.
+        """
+        table = self._table
+        if table[2] is not None and table[0][0] <= start and end < table[2]:
+            return table
+        with self._lock:
+            times, offsets, table_end = self._table
+            if table_end is None:
+                first = start - start % YEAR_MICROS
+                times, offsets = self._merge(times, offsets, *find_transitions(
+                    self.tz, first, first + YEAR_MICROS))
+                table_end = first + YEAR_MICROS
+            while start < times[0]:
+                times, offsets = self._merge(times, offsets, *find_transitions(
+                    self.tz, times[0] - YEAR_MICROS, times[0]))
+            while end >= table_end:
+                times, offsets = self._merge(times, offsets, *find_transitions(
+                    self.tz, table_end, table_end + YEAR_MICROS))
+                table_end += YEAR_MICROS
+            table = self._table = (times, offsets, table_end)
+        return table
+
+    def span(self, start, end):
+        """The transitions between start and end.
+
+        :returns: the times since when an offset is valid, starting with
+            `start`, and the offsets.
+        """
+        times, offsets, _ = self.cover(start, end)
+        first = bisect.bisect_right(times, start) - 1
+        last = bisect.bisect_right(times, end)
+        return [start] + times[first + 1:last], offsets[first:last]
+
+    def offset(self, micros):
+        """The UTC offset at that time in microseconds."""
+        times, offsets, end = self._table
+        if end is None or not times[0] <= micros < end:
+            times, offsets, _ = self.cover(micros, micros)
+        return offsets[bisect.bisect_right(times, micros) - 1]
+
+    def local(self, micros):
+        """Convert UTC epoch microseconds into local wall clock ones."""
+        return micros + self.offset(micros)
+
+    def _candidates(self, local):
+        """The UTC times, which may have this local wall clock time."""
+        times, offsets, _ = self.cover(
+            local - 2 * DAY_MICROS, local + 2 * DAY_MICROS)
+        first = bisect.bisect_right(times, local - 2 * DAY_MICROS) - 1
+        last = bisect.bisect_right(times, local + 2 * DAY_MICROS)
+        offsets = offsets[first:last]
+        return offsets, sorted(
+            local - offset for offset in set(offsets)
+            if self.offset(local - offset) == offset)
+
+    def utc(self, local):
+        """Convert local wall clock epoch microseconds into UTC ones.
+
+        Like `pendulum.datetime`, ambiguous times resolve to the later one
+        and non existing times are shifted forward.
+        """
+        offsets, valid = self._candidates(local)
+        if valid:
+            return valid[-1]
+        return local - min(offsets)
+
+    def day(self, micros):
+        """The local day of a time in days since the epoch."""
+        return self.local(micros) // DAY_MICROS
+
+    def date(self, micros):
+        """The local date of a time."""
+        return datetime.date.fromordinal(self.day(micros) + EPOCH_ORDINAL)
+
+    def midnight(self, day):
+        """The UTC epoch microseconds of the start of a local day."""
+        try:
+            return self._midnights[day]
+        except KeyError:
+            midnight = self._midnights[day] = self.utc(day * DAY_MICROS)
+            return midnight
+
+    def local_datetime(self, micros):
+        """Create the local `DateTime` of UTC epoch microseconds."""
+        offset = self.offset(micros)
+        local = micros + offset
+        wall = EPOCH + datetime.timedelta(microseconds=local)
+        # the second of two equal wall clock times
+        fold = int(local - offset != self._first_utc(local, offset))
+        return pendulum.DateTime(
+            wall.year, wall.month, wall.day, wall.hour, wall.minute,
+            wall.second, wall.microsecond, tzinfo=self.tz, fold=fold)
+
+    def _first_utc(self, local, offset):
+        times, offsets, _ = self._table
+        index = bisect.bisect_right(times, local - offset) - 1
+        # wall clock times repeat only right after a backward transition
+        if index > 0 and offsets[index - 1] > offset\
+                and local - offsets[index - 1] >= times[index - 1]\
+                and local - offsets[index - 1] < times[index]:
+            return local - offsets[index - 1]
+        return local - offset
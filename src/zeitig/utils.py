@@ -1,4 +1,13 @@
+import collections
+import datetime
 import functools
+import itertools
+import os
+import queue
+import re
+import stat
+import sys
+import threading
 
 import pendulum
 
@@ -16,6 +25,88 @@ class reify:
         return val
 
 
+class LRUCache:
+
+    """A mapping, which evicts the least recently used items.
+
+    :param maxsize: the maximal number of items or `None` for no limit.
+    :param maxbytes: the maximal estimated size of all items or `None` for no
+        limit.
+    """
+
+    def __init__(self, maxsize=None, maxbytes=None, sizeof=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof if sizeof is not None else deep_sizeof
+        self.items = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} {len(self)}/{self.maxsize} items'
+                f' {self.bytes}/{self.maxbytes} bytes'
+                f' hits={self.hits} misses={self.misses}>')
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __getitem__(self, key):
+        try:
+            value, _ = self.items[key]
+        except KeyError:
+            self.misses += 1
+            raise
+        self.items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        self.pop(key, None)
+        size = self.sizeof(value) if self.maxbytes is not None else 0
+        self.items[key] = value, size
+        self.bytes += size
+        while self.items and (
+                self.maxsize is not None and len(self.items) > self.maxsize
+                or self.maxbytes is not None and self.bytes > self.maxbytes
+        ):
+            _, (_, size) = self.items.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def pop(self, key, *default):
+        try:
+            value, size = self.items.pop(key)
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        self.bytes -= size
+        return value
+
+    def clear(self):
+        self.items.clear()
+        self.bytes = 0
+
+
+def deep_sizeof(obj, attributes=True):
+    """Estimate the memory size of an object.
+
+    Containers are followed, the attributes of objects only at the top.
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, False) + deep_sizeof(value, False)
+                    for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_sizeof(item, False) for item in obj)
+    elif attributes and hasattr(obj, '__dict__'):
+        size += deep_sizeof(obj.__dict__, False)
+    return size
+
+
 class adict(dict):
     def __init__(self, *args, **kwargs):
         self.__dict__ = self
@@ -33,6 +124,215 @@ def pipeline(*iterators):
     return pipeline
 
 
+def batched(iterable, size):
+    """Generate lists of up to `size` items."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def fsync_dir(path):
+    """Flush the entries of a directory to disk, if the platform allows."""
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def stat_stamp(paths):
+    """A stamp of files and directories, which changes with their content.
+
+    Files are stamped by their modification time and size, directories by
+    their modification time and number of entries, so a change within the
+    resolution of the file system timestamps is noticed too.
+
+    :returns: a dict of the stamps by path or `None`, if a path is missing.
+    """
+    stamp = {}
+    for path in paths:
+        try:
+            path_stat = path.stat()
+            size = len(os.listdir(str(path)))\
+                if stat.S_ISDIR(path_stat.st_mode) else path_stat.st_size
+        except FileNotFoundError:
+            return None
+        stamp[str(path)] = [path_stat.st_mtime_ns, size]
+    return stamp
+
+
+def read_ahead(iterable, maxsize=64, lock=None):
+    """Iterate in a thread ahead of the consumer.
+
+    :param maxsize: the maximal number of items read ahead.
+    :param lock: a lock held while the next item is produced.
+    """
+    items = queue.Queue(maxsize)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            while True:
+                if lock is not None:
+                    with lock:
+                        item = next(iterator, done)
+                else:
+                    item = next(iterator, done)
+                if not put((item, None)) or item is done:
+                    return
+        except Exception as ex:
+            put((done, ex))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, ex = items.get()
+            if ex is not None:
+                raise ex
+            if item is done:
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
+async def iterate_async(iterable, *, maxsize=64):
+    """Iterate a blocking iterable in a thread ahead of the consumer.
+
+    The items are handed to the running event loop by
+    `call_soon_threadsafe`, so the loop never waits for the thread.
+
+    :param maxsize: the maximal number of items read ahead.
+    """
+    # asyncio is slow to import and not needed to record events
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+    slots = threading.Semaphore(maxsize)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item, ex=None):
+        while not slots.acquire(timeout=0.1):
+            if stopped.is_set():
+                return False
+        try:
+            loop.call_soon_threadsafe(items.put_nowait, (item, ex))
+        except RuntimeError:
+            # the loop is closed
+            return False
+        return not stopped.is_set()
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except Exception as ex:
+            put(done, ex)
+        else:
+            put(done)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, ex = await items.get()
+            slots.release()
+            if ex is not None:
+                raise ex
+            if item is done:
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
 def utcnow():
     """Return utcnow."""
     return pendulum.now(tz='UTC')
+
+
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+# the last converted datetime, since the end of a situation is usually the
+# start of the next one
+_last_epoch_micros = (None, None)
+
+
+def epoch_micros(value):
+    """Return the exact microseconds since epoch."""
+    global _last_epoch_micros
+    last, last_micros = _last_epoch_micros
+    if value is last:
+        return last_micros
+    micros = ((value.toordinal() - EPOCH_ORDINAL) * 86400
+              + value.hour * 3600 + value.minute * 60 + value.second)\
+        * 1000000 + value.microsecond
+    tzinfo = value.tzinfo
+    # pendulum computes offsets slowly, even for UTC
+    if tzinfo is not None and tzinfo is not pendulum.UTC\
+            and tzinfo is not datetime.timezone.utc:
+        offset = value.utcoffset()
+        if offset:
+            micros -= offset // MICROSECOND
+    _last_epoch_micros = (value, micros)
+    return micros
+
+
+def from_epoch_micros(micros):
+    """Return the UTC `DateTime` of microseconds since epoch."""
+    value = EPOCH + datetime.timedelta(microseconds=micros)
+    return pendulum.DateTime(
+        value.year, value.month, value.day,
+        value.hour, value.minute, value.second, value.microsecond,
+        tzinfo=pendulum.UTC,
+    )
+
+
+# the format of `str(DateTime)` in UTC, which is used for event names
+RE_UTC_TIMESTAMP = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.(\d{6}))?'
+    r'(?:\+00:00|Z)\Z'
+)
+
+
+def parse_utc(value):
+    """Parse a timestamp string into a UTC `DateTime`.
+
+    Canonical UTC timestamps as written by the store are decoded directly,
+    everything else is left to `pendulum.parse`.
+    """
+    match = RE_UTC_TIMESTAMP.match(value)
+    if match is None:
+        return pendulum.parse(value).in_tz('UTC')
+    year, month, day, hour, minute, second, microsecond = match.groups()
+    return pendulum.DateTime(
+        int(year), int(month), int(day), int(hour), int(minute), int(second),
+        int(microsecond) if microsecond else 0,
+        tzinfo=pendulum.UTC,
+    )
@@ -92,3 +92,56 @@ def test_datetime_change(last, now, result):
         dt_change.is_new_week,
         dt_change.is_new_month,
         dt_change.is_new_year) == result
+
+
+@pytest.mark.parametrize('last, now, result', [
+    ('2018-01-01T08:00', '2018-01-01T18:00', (0, 0, 0, 0)),
+    ('2018-01-02', '2018-01-09', (7, 1, 0, 0)),
+    # a day of 23 hours
+    ('2018-03-24T12:00', '2018-03-25T12:00', (1, 0, 0, 0)),
+    ('2018-02-28', '2018-01-31', (-28, -4, -1, 0)),
+])
+def test_datetime_change_local(last, now, result):
+    from zeitig import aggregates, events
+    from pendulum import parse, timezone
+
+    tz = timezone('Europe/Berlin')
+
+    last_event = events.Situation(start=parse(last, tz=tz), tz=tz)
+    event = events.Situation(start=parse(now, tz=tz), tz=tz)
+    dt_change = aggregates.DatetimeChange(last_event, event)
+    assert (
+        dt_change.is_new_day,
+        dt_change.is_new_week,
+        dt_change.is_new_month,
+        dt_change.is_new_year) == result
+
+
+def test_datetime_stats_working_days():
+    import pendulum
+    from zeitig import aggregates, events
+
+    tz = pendulum.timezone('Europe/Berlin')
+    start = pendulum.datetime(2018, 4, 1, 23, tz=tz)
+    situations = [
+        events.Work(start=start, end=start.add(hours=2), tz=tz),
+        events.Work(start=start.add(hours=3), end=start.add(hours=4), tz=tz),
+    ]
+    *_, stats = aggregates.DatetimeStats.aggregate(
+        aggregates.DatetimeChange.aggregate(
+            aggregates.Summary.aggregate(situations)))
+    assert stats.working_days == [pendulum.date(2018, 4, 1),
+                                  pendulum.date(2018, 4, 2)]
+    assert all(isinstance(day, pendulum.Date) for day in stats.working_days)
+
+
+def test_calendar_key():
+    import datetime
+    from zeitig import aggregates
+
+    monday = aggregates.CalendarKey.from_date(datetime.date(2018, 4, 2))
+    sunday = aggregates.CalendarKey.from_date(datetime.date(2018, 4, 8))
+    assert monday.week == sunday.week
+    assert aggregates.CalendarKey.from_date(
+        datetime.date(2018, 4, 9)).week == monday.week + 1
+    assert (monday.month, monday.year) == (2018 * 12 + 3, 2018)
@@ -0,0 +1,84 @@
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+
+@pytest.fixture(params=['UTC', 'Europe/Berlin'])
+def situations(request):
+    import pendulum
+    from zeitig import events
+
+    tz = pendulum.timezone(request.param)
+    situations = []
+    # spans a daylight saving time change in Berlin
+    start = pendulum.datetime(2018, 3, 23, 7, 7, 13, tz=tz)
+    for i, hours in enumerate([2, 1, 3, 18, 4, 0.5, 2, 20, 9, 1, 5]):
+        cls = events.Break if i % 2 else events.Work
+        end = start.add(seconds=int(hours * 3600) + 7 * 60)
+        situations.append(cls(start=start, end=end, tags=[i], tz=tz))
+        start = end
+    return situations
+
+
+@pytest.mark.parametrize('size', [None, 15 * 60])
+def test_engine(situations, size):
+    from zeitig import aggregates, columnar, events
+
+    tz = situations[0].tz
+    round = events.Round(size) if size else None
+    for situation in situations:
+        situation.round = round
+
+    engine = columnar.Engine(columnar.Columns.from_situations(situations),
+                             tz=tz, round=round)
+
+    *_, summary = aggregates.Summary.aggregate(situations)
+    assert (engine.summary.start, engine.summary.end)\
+        == (summary.start, summary.end)
+    assert (engine.summary.works.total_seconds(),
+            engine.summary.breaks.total_seconds())\
+        == (summary.works.total_seconds(), summary.breaks.total_seconds())
+
+    *_, stats = aggregates.DatetimeStats.aggregate(
+        aggregates.DatetimeChange.aggregate(
+            aggregates.filter_no_breaks(
+                aggregates.Summary.aggregate(situations))))
+    assert engine.working_days.tolist() == stats.working_days
+    assert engine.hours_per_working_day == stats.hours_per_working_day
+
+    days = [
+        day.duration.total_seconds()
+        for day in aggregates.JoinedWorkDay.aggregate(
+            aggregates.split_at_new_day(situations))
+        if isinstance(day, aggregates.JoinedWorkDay)
+    ]
+    works = engine.days.works
+    assert works[works > 0].tolist() == days
+    assert engine.weeks.works.sum() == engine.months.works.sum()\
+        == works.sum()
+
+
+def test_columns_from_groups(situations):
+    from zeitig import columnar
+
+    columns = columnar.Columns.from_groups({
+        'foo': situations[:4], 'bar': situations[4:]})
+    assert columns.groups == ['foo', 'bar']
+    assert columns.select(1).start.tolist()\
+        == columnar.Columns.from_situations(situations[4:]).start.tolist()
+
+
+@pytest.mark.parametrize('size', [None, 15 * 60])
+def test_engine_empty(size):
+    import pendulum
+    from zeitig import columnar, events
+
+    engine = columnar.Engine(columnar.Columns.from_situations([]),
+                             tz=pendulum.timezone('Europe/Berlin'),
+                             round=events.Round(size) if size else None)
+    assert engine.summary.works.total_seconds() == 0
+    assert engine.working_days.tolist() == []
+    assert engine.hours_per_working_day == 0
+    for totals in (engine.days, engine.weeks, engine.months):
+        assert (totals.dates.tolist(), totals.works.tolist(),
+                totals.breaks.tolist()) == ([], [], [])
@@ -85,3 +85,131 @@ def test_round(dt, div, result, events):
         pendulum.parse(result[0], tz=events.local_timezone),
         pendulum.parse(result[1], tz=events.local_timezone),
     )
+
+
+@pytest.mark.parametrize('dt, div, result', [
+    # the end of the last block of a day wraps to its start
+    ('2018-01-01T23:50:00+01:00', 60 * 15, ('2018-01-01T23:45:00+01:00',
+                                            '2018-01-01T00:00:00+01:00')),
+    # non existing local times are shifted
+    ('2018-03-25T03:10:00+02:00', 60 * 60 * 2, ('2018-03-25T03:00:00+02:00',
+                                                '2018-03-25T04:00:00+02:00')),
+    # ambiguous local times use the later offset
+    ('2018-10-28T02:50:00+02:00', 60 * 15, ('2018-10-28T02:45:00+01:00',
+                                            '2018-10-28T03:00:00+01:00')),
+])
+def test_round_dst(dt, div, result, events):
+    import pendulum
+    r = events.Round(div)
+    dt = pendulum.parse(dt).in_tz('Europe/Berlin')
+    assert tuple(x.isoformat() for x in r.block(dt)) == result
+    assert (r.floor(dt).isoformat(), r.ceil(dt).isoformat()) == result
+
+
+def test_round_bounds(events):
+    import pendulum
+    from zeitig import utils
+
+    r = events.Round(60 * 15)
+    local = pendulum.local_timezone()
+    situations = [
+        events.Work(start=pendulum.parse('2018-04-01T08:07:00', tz=local),
+                    end=pendulum.parse('2018-04-01T09:01:00', tz=local)),
+        events.Break(start=pendulum.parse('2018-04-01T09:01:00', tz=local),
+                     end=pendulum.parse('2018-04-01T09:29:59', tz=local)),
+        events.Work(start=pendulum.parse('2018-04-01T09:30:00', tz=local),
+                    end=pendulum.parse('2018-04-01T23:59:00', tz=local)),
+    ]
+
+    def local_micros(dt):
+        return utils.epoch_micros(dt) + dt.offset * events.MICROS
+
+    starts = [local_micros(s.local_start) for s in situations]
+    ends = [local_micros(s.local_end) for s in situations]
+    works = [isinstance(s, events.Work) for s in situations]
+    for s in situations:
+        s.round = r
+    expected = ([local_micros(s.local_start) for s in situations],
+                [local_micros(s.local_end) for s in situations])
+    assert r.round_bounds(starts, ends, works) == expected
+
+    numpy = pytest.importorskip('numpy')
+    rounded = r.round_bounds(numpy.array(starts), numpy.array(ends),
+                             numpy.array(works))
+    assert [x.tolist() for x in rounded] == list(expected)
+
+
+def test_event_param_deserialize_once(events, mocker):
+    import pendulum
+
+    event = events.RemoveEvent(when='2018-04-01T08:00:00+00:00', note='foo')
+    deserialize = mocker.spy(events.RemoveEvent.note, 'deserialize')
+    assert event.note is event.note
+    assert deserialize.call_count == 1
+
+    event.note = 'bar'
+    assert event.note.pattern == 'bar'
+    assert event.when == pendulum.parse('2018-04-01T08:00:00+00:00')
+    assert dict(event.source()) == {
+        'when': '2018-04-01T08:00:00+00:00',
+        'type': 'remove',
+        'note': 'bar',
+    }
+
+
+def test_situation_cached_local_times(events):
+    import pendulum
+
+    tz = pendulum.timezone('Europe/Berlin')
+    work = events.Work(start=pendulum.datetime(2018, 4, 1, 8, 7, tz=tz),
+                       end=pendulum.datetime(2018, 4, 1, 12, tz=tz),
+                       round=events.Round(900), tz=tz, tags=['foo'])
+    assert not hasattr(work, '__dict__')
+    assert str(work.start) == '2018-04-01T06:07:00+00:00'
+    assert work.local_start is work.local_start
+    assert str(work.local_start) == '2018-04-01T08:00:00+02:00'
+    assert work.local_period.in_minutes() == 240
+
+    # changes drop the cached values
+    work.end = pendulum.datetime(2018, 4, 1, 13, tz=tz)
+    assert work.local_period.in_minutes() == 300
+    assert work.period.in_minutes() == 293
+    work.round = None
+    assert str(work.local_start) == '2018-04-01T08:07:00+02:00'
+    work.tz = pendulum.timezone('UTC')
+    assert str(work.local_start) == '2018-04-01T06:07:00+00:00'
+
+
+@pytest.mark.parametrize('copy_function', ['pickle', 'copy', 'deepcopy'])
+def test_situation_copy(events, copy_function):
+    import copy
+    import pickle
+    import pendulum
+    from zeitig import aggregates
+
+    tz = pendulum.timezone('Europe/Berlin')
+    copy_situation = {
+        'pickle': lambda x: pickle.loads(pickle.dumps(x)),
+        'copy': copy.copy,
+        'deepcopy': copy.deepcopy,
+    }[copy_function]
+    work = events.Work(start=pendulum.datetime(2018, 4, 1, 8, 7, tz=tz),
+                       end=pendulum.datetime(2018, 4, 1, 12, tz=tz),
+                       round=events.Round(900), tz=tz, tags=['foo'],
+                       note='bar')
+    work.group, work.is_last = 'baz', True
+    work.local_period
+    day = aggregates.JoinedWorkDay(pendulum.datetime(2018, 4, 1, tz=tz),
+                                   tags=['foo'],
+                                   duration=pendulum.duration(hours=4))
+
+    copied = copy_situation(work)
+    assert (copied.start, copied.end, copied.round.size, copied.tz.name,
+            copied.tags, copied.notes, copied.group, copied.is_last) == (
+        work.start, work.end, 900, 'Europe/Berlin', ['foo'], ['bar'], 'baz',
+        True)
+    assert copied.local_period == work.local_period
+    copied.end = pendulum.datetime(2018, 4, 1, 13, tz=tz)
+    assert copied.local_period.in_minutes() == 300
+    assert work.local_period.in_minutes() == 240
+    assert copy_situation(day) == day
@@ -0,0 +1,89 @@
+import io
+import json
+
+import pytest
+
+
+@pytest.fixture
+def store(tmp_path):
+    import pendulum
+    from zeitig import events, store
+
+    group_store = store.Store(store_path=tmp_path, group='foo')
+    for event in (
+            events.WorkEvent(when=pendulum.parse('2018-04-01T06:00:00+00:00'),
+                             tags=['foo']),
+            events.AddEvent(when=pendulum.parse('2018-04-01T07:00:00+00:00'),
+                            tags=['bar'], note='a, "b"'),
+            events.BreakEvent(when=pendulum.parse('2018-04-01T10:07:00+00:00')),
+            events.RemoveEvent(when=pendulum.parse('2018-04-01T10:30:00+00:00'),
+                               note='^a'),
+    ):
+        group_store.persist(event)
+    return group_store
+
+
+def test_export_situations(store, mocker):
+    import pendulum
+    from zeitig import events, exporting
+
+    mocker.patch.object(events, 'get_local_timezone',
+                        return_value=pendulum.timezone('Europe/Berlin'))
+    export = exporting.Export(
+        store, start=None, end=pendulum.parse('2018-04-01T11:00:00+00:00'),
+        round=events.Round(900))
+    output = io.StringIO()
+    export.write(output)
+
+    work, lunch = map(json.loads, output.getvalue().splitlines())
+    assert work == {
+        'type': 'work',
+        'start': '2018-04-01T08:00:00+02:00',
+        'end': '2018-04-01T12:15:00+02:00',
+        'seconds': 15300.0,
+        'tags': ['foo', 'bar'],
+        'notes': ['a, "b"'],
+    }
+    assert (lunch['type'], lunch['start'], lunch['end']) == (
+        'break', '2018-04-01T12:15:00+02:00', '2018-04-01T13:00:00+02:00')
+
+
+def test_export_events_csv(store):
+    import pendulum
+    from zeitig import exporting, importing
+
+    export = exporting.Export(
+        store, start=pendulum.parse('2018-04-01T07:00:00+00:00'),
+        end=pendulum.parse('2018-04-01T10:30:00+00:00'), situations=False)
+    output = io.StringIO()
+    export.write(output, format='csv')
+
+    assert output.getvalue() == (
+        'type,when,tags,note\n'
+        'add,2018-04-01T07:00:00+00:00,bar,"a, ""b"""\n'
+        'break,2018-04-01T10:07:00+00:00,,\n'
+    )
+    add, _ = importing.iter_events(io.StringIO(output.getvalue()),
+                                   format='csv')
+    assert (add.type, add.tags, add.note) == ('add', ['bar'], 'a, "b"')
+
+
+def test_export_events_all_groups(store):
+    import pendulum
+    from zeitig import events, exporting, store as zstore
+
+    bar = zstore.Store(store_path=store.store_path, group='bar')
+    bar.persist(events.WorkEvent(
+        when=pendulum.parse('2018-04-01T08:00:00+00:00')))
+    export = exporting.Export(
+        store, start=None, end=pendulum.parse('2018-04-01T10:00:00+00:00'),
+        all_groups=True, situations=False)
+    output = io.StringIO()
+    export.write(output)
+
+    assert [(row['group'], row['when']) for row in
+            map(json.loads, output.getvalue().splitlines())] == [
+        ('foo', '2018-04-01T06:00:00+00:00'),
+        ('foo', '2018-04-01T07:00:00+00:00'),
+        ('bar', '2018-04-01T08:00:00+00:00'),
+    ]
@@ -0,0 +1,72 @@
+import io
+
+import pytest
+
+
+def test_iter_events_jsonl():
+    import pendulum
+    from zeitig import events, importing
+
+    file = io.StringIO(
+        '{"type": "work", "when": "2018-04-01 08:00", "tags": ["foo"]}\n'
+        '\n'
+        '{"type": "remove", "when": "2018-04-01T10:00:00+00:00",'
+        ' "note": "^foo"}\n')
+    work, remove = importing.iter_events(
+        file, tz=pendulum.timezone('Europe/Berlin'))
+
+    assert isinstance(work, events.WorkEvent)
+    assert (str(work.when), work.tags) == (
+        '2018-04-01T06:00:00+00:00', ['foo'])
+    assert isinstance(remove, events.RemoveEvent)
+    assert remove.note.pattern == '^foo'
+
+
+def test_iter_events_csv():
+    import pendulum
+    from zeitig import events, importing
+
+    file = io.StringIO(
+        'type,when,tags,note\n'
+        'work,2018-04-01 08:00,"foo, bar",\n'
+        'break,2018-04-01 12:00,,lunch\n')
+    work, lunch = importing.iter_events(
+        file, format='csv', tz=pendulum.timezone('UTC'))
+
+    assert (work.type, work.tags) == ('work', ['foo', 'bar'])
+    assert isinstance(lunch, events.BreakEvent)
+    assert (str(lunch.when), lunch.tags, lunch.note) == (
+        '2018-04-01T12:00:00+00:00', [], 'lunch')
+
+
+@pytest.mark.parametrize('text, format, line', [
+    ('{"type": "work", "when": "2018-04-01"}\n{"type": "foo"}', 'jsonl', 2),
+    ('{"type": "work"}', 'jsonl', 1),
+    ('{"type": "work", "when": "2018-04-01", "foo": 1}', 'jsonl', 1),
+    ('{"type": "work", "when": "tomorrow"}', 'jsonl', 1),
+    ('{"type": "work", "when": "2018-04-01", "tags": "foo"}', 'jsonl', 1),
+    ('{"type": "work", "when": "2018-05-01 08:00", "tags": 5}', 'jsonl', 1),
+    ('[]', 'jsonl', 1),
+    ('{', 'jsonl', 1),
+    ('type,when,foo\nwork,2018-04-01,', 'csv', 1),
+    ('type,when\nwork,2018-04-01\nadd,2018-04-02\nbar,2018-04-03', 'csv', 4),
+])
+def test_iter_events_invalid(text, format, line):
+    import pendulum
+    from zeitig import importing
+
+    with pytest.raises(importing.ImportException) as ex:
+        list(importing.iter_events(io.StringIO(text), format=format,
+                                   tz=pendulum.timezone('UTC')))
+    assert ex.value.line == line
+
+
+@pytest.mark.parametrize('filename, format', [
+    ('history.csv', 'csv'),
+    ('history.jsonl', 'jsonl'),
+    ('<stdin>', 'jsonl'),
+])
+def test_guess_format(filename, format):
+    from zeitig import importing
+
+    assert importing.guess_format(filename) == format
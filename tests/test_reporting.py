@@ -0,0 +1,279 @@
+def test_report_generate(tmp_path):
+    import io
+    import pendulum
+    from zeitig import events, reporting, store
+
+    ev_store = store.Store(store_path=tmp_path, group='foo')
+    start = pendulum.parse('2018-04-02T08:00:00+00:00')
+    for i in range(6):
+        event_cls = events.BreakEvent if i % 2 else events.WorkEvent
+        ev_store.persist(event_cls(when=start.add(hours=i), tags=[str(i)]))
+
+    report = reporting.Report(ev_store, start=None,
+                              end=start.add(hours=6))
+    chunks = list(report.generate(template_name='console'))
+    assert len(chunks) > 1
+
+    output = io.StringIO()
+    report.print(template_name='console', file=output)
+    assert output.getvalue() == ''.join(chunks) + '\n'
+    assert output.getvalue() == report.render(template_name='console')\
+        + '\n'
+    assert '2018-04-02 10:00:00 - 11:00:00 - 1.00 - 2' in output.getvalue()
+
+
+def test_report_work_days_rollups(tmp_path, mocker):
+    import pendulum
+    from zeitig import events, reporting, sourcing, store
+
+    tz = events.get_local_timezone()
+    ev_store = store.Store(store_path=tmp_path, group='foo')
+    for day in (2, 3, 4):
+        for hour, event_cls in ((8, events.WorkEvent),
+                                (12, events.BreakEvent),
+                                (13, events.WorkEvent),
+                                (17, events.BreakEvent)):
+            ev_store.persist(event_cls(
+                when=pendulum.datetime(2018, 4, day, hour, tz=tz).in_tz('UTC'),
+                tags=[str(day)]))
+    # the last day is still open
+    ev_store.persist(events.WorkEvent(
+        when=pendulum.datetime(2018, 4, 5, 8, tz=tz).in_tz('UTC')))
+    end = pendulum.datetime(2018, 4, 5, 10, tz=tz).in_tz('UTC')
+
+    def render():
+        return reporting.Report(
+            store.Store(store_path=tmp_path, group='foo'),
+            start=None, end=end).render(template_name='days')
+
+    rendered = render()
+    assert '2018-04-03 Tuesday - 8.00 - 3' in rendered
+    assert '2018-04-05 Thursday - 2.00' in rendered
+    assert 'Total hours: 26.00' in rendered
+    assert 'Total days: 4' in rendered
+
+    # the events of the rolled up days are not read again
+    load_event = mocker.spy(sourcing.Sourcerer, 'load_event')
+    fetch = mocker.spy(store.Store, 'fetch')
+    assert render() == rendered
+    names = [call[0][1] for call in load_event.call_args_list
+             + fetch.call_args_list]
+    assert names
+    assert min(map(pendulum.parse, names))\
+        == pendulum.datetime(2018, 4, 4, 17, tz=tz)
+
+
+def test_report_days_all_groups(tmp_path):
+    import pendulum
+    from zeitig import events, reporting, store
+
+    tz = events.get_local_timezone()
+    start = pendulum.datetime(2018, 4, 2, 8, tz=tz).in_tz('UTC')
+    for group, hours in (('foo', 2), ('bar', 3)):
+        ev_store = store.Store(store_path=tmp_path, group=group)
+        ev_store.persist(events.WorkEvent(when=start, tags=[group]))
+        ev_store.persist(events.BreakEvent(when=start.add(hours=hours)))
+        ev_store.persist(events.WorkEvent(when=start.add(days=1)))
+
+    report = reporting.Report(ev_store, start=None,
+                              end=start.add(days=1, hours=1),
+                              all_groups=True)
+    days = list(report.days())
+    assert [(str(day.date), day.works.total_hours(), day.tags)
+            for day in days] == [('2018-04-02', 5.0, ['bar', 'foo']),
+                                 ('2018-04-03', 2.0, [])]
+    assert days[-1].last is None
+    work_days = list(report.work_days())
+    assert [(str(day.date.date()), day.duration.total_hours(), day.is_last)
+            for day in work_days] == [('2018-04-02', 5.0, False),
+                                      ('2018-04-03', 2.0, True)]
+
+    # the caches of every group are written
+    for group in ('foo', 'bar'):
+        group_store = store.Store(store_path=tmp_path, group=group)
+        assert group_store.source_cache.path.is_file()
+        assert group_store.rollups.rollups
+
+
+def test_report_render_async(tmp_path):
+    import asyncio
+    import pendulum
+    from zeitig import events, reporting, store
+
+    ev_store = store.Store(store_path=tmp_path, group='foo')
+    start = pendulum.parse('2018-04-02T08:00:00+00:00')
+    for i in range(6):
+        event_cls = events.BreakEvent if i % 2 else events.WorkEvent
+        ev_store.persist(event_cls(when=start.add(hours=i), tags=[str(i)]))
+
+    report = reporting.Report(ev_store, start=None, end=start.add(hours=6))
+    loop = asyncio.new_event_loop()
+    try:
+        rendered = loop.run_until_complete(
+            report.render_async(template_name='console'))
+    finally:
+        loop.close()
+    assert rendered == report.render(template_name='console')
+
+
+def test_report_render_async_not_blocking(tmp_path, mocker):
+    import asyncio
+    import time
+    import pendulum
+    import pytest
+    from zeitig import events, reporting, sourcing, store
+
+    ev_store = store.Store(store_path=tmp_path, group='foo')
+    start = pendulum.parse('2018-04-02T08:00:00+00:00')
+    for i in range(6):
+        event_cls = events.BreakEvent if i % 2 else events.WorkEvent
+        ev_store.persist(event_cls(when=start.add(hours=i), tags=[str(i)]))
+
+    generate = sourcing.Sourcerer.generate
+
+    def slow_generate(self, **kwargs):
+        for situation in generate(self, **kwargs):
+            time.sleep(0.02)
+            yield situation
+
+    mocker.patch.object(sourcing.Sourcerer, 'generate', slow_generate)
+    report = reporting.Report(ev_store, start=None, end=start.add(hours=6))
+
+    async def render():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        ticker = asyncio.ensure_future(tick())
+        try:
+            rendered = await report.render_async(template_name='console')
+        finally:
+            ticker.cancel()
+        return rendered, ticks
+
+    loop = asyncio.new_event_loop()
+    try:
+        rendered, ticks = loop.run_until_complete(render())
+        with pytest.raises(reporting.ReportTemplateNotFound):
+            loop.run_until_complete(report.render_async(template_name='xyz'))
+    finally:
+        loop.close()
+    assert '2018-04-02 10:00:00 - 11:00:00 - 1.00 - 2' in rendered
+    # the event loop keeps running while the report is rendered
+    assert ticks > 5
+
+
+def test_jinja_env_cached(tmp_path, mocker):
+    import os
+    import qtoml
+    from zeitig import reporting, store
+
+    ev_store = store.Store(store_path=tmp_path, group='foo')
+    templates = reporting.Templates(ev_store)
+    env = templates.get_jinja_env('console')
+    loads = mocker.spy(qtoml, 'loads')
+    assert reporting.Templates(ev_store).get_jinja_env('console') is env
+    assert env.get_template('console') is env.get_template('console')
+
+    syntax_path = ev_store.group_path.joinpath(reporting.TEMPLATE_SYNTAX_NAME)
+    syntax_path.write_text('[templates]\nconsole = "latex"\n')
+    latex_env = templates.get_jinja_env('console')
+    assert latex_env is not env
+    assert latex_env.block_start_string == '\\BLOCK{'
+    assert templates.get_jinja_env('console') is latex_env
+    assert loads.call_count == 1
+
+    # a modified config is parsed again, even within the same mtime
+    stat = syntax_path.stat()
+    syntax_path.write_text('[jinja_env.other]\ntrim_blocks = true\n'
+                           '[templates]\nconsole = "other"\n')
+    os.utime(str(syntax_path), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    other_env = templates.get_jinja_env('console')
+    assert other_env.trim_blocks is True
+    assert other_env not in (env, latex_env)
+    assert loads.call_count == 2
+
+
+def test_jinja_env_list_options(tmp_path):
+    from zeitig import reporting, store
+
+    ev_store = store.Store(store_path=tmp_path, group='foo')
+    syntax_path = ev_store.group_path.joinpath(reporting.TEMPLATE_SYNTAX_NAME)
+    syntax_path.parent.mkdir(parents=True, exist_ok=True)
+    syntax_path.write_text('[jinja_env.do]\nextensions = ["jinja2.ext.do"]\n'
+                           '[templates]\nconsole = "do"\n')
+    templates = reporting.Templates(ev_store)
+    env = templates.get_jinja_env('console')
+    assert 'jinja2.ext.ExprStmtExtension' in env.extensions
+    assert reporting.Templates(ev_store).get_jinja_env('console') is env
+
+
+def test_compile_templates(tmp_path, mocker):
+    import os
+    import jinja2
+    import pendulum
+    from zeitig import events, reporting, store
+
+    ev_store = store.Store(store_path=tmp_path, group='foo')
+    start = pendulum.parse('2018-04-02T08:00:00+00:00')
+    ev_store.persist(events.WorkEvent(when=start, tags=['a']))
+    template_path = ev_store.group_path.joinpath(reporting.TEMPLATE_PATH_NAME)
+    template_path.mkdir()
+    template_path.joinpath('short').write_text(
+        '{% for s in report.source %}{{ s.tags|join(",") }}{% endfor %}')
+
+    report = reporting.Report(ev_store, start=None, end=start.add(hours=1))
+    expected = report.render(template_name='console')
+    assert report.compile_templates() == ['console', 'days', 'short']
+
+    compile = mocker.spy(jinja2.Environment, 'compile')
+    report = reporting.Report(ev_store, start=None, end=start.add(hours=1))
+    assert report.render(template_name='console') == expected
+    assert report.render(template_name='short') == 'a'
+    assert not compile.called
+
+    # a changed source is compiled again
+    template_file = template_path.joinpath('short')
+    template_file.write_text('{{ report.group }}')
+    stat = template_file.stat()
+    os.utime(str(template_file), ns=(stat.st_atime_ns,
+                                     stat.st_mtime_ns + 1000000000))
+    assert report.render(template_name='short') == 'foo'
+    assert compile.called
+
+
+def test_compile_templates_keeps_other_groups(tmp_path, mocker):
+    import jinja2
+    import pendulum
+    from zeitig import events, reporting, store
+
+    start = pendulum.parse('2018-04-02T08:00:00+00:00')
+    reports = {}
+    for group in ('foo', 'bar'):
+        ev_store = store.Store(store_path=tmp_path, group=group)
+        ev_store.persist(events.WorkEvent(when=start, tags=[group]))
+        template_path = ev_store.group_path.joinpath(
+            reporting.TEMPLATE_PATH_NAME)
+        template_path.mkdir()
+        template_path.joinpath('short').write_text(
+            '{% for s in report.source %}{{ s.tags|join(",") }}{% endfor %}')
+        reports[group] = reporting.Report(ev_store, start=None,
+                                          end=start.add(hours=1))
+    reports['foo'].compile_templates()
+    reports['bar'].compile_templates()
+
+    compile = mocker.spy(jinja2.Environment, 'compile')
+    env = reports['foo'].get_jinja_env('short')
+    template = env.get_template('short')
+    assert not compile.called
+    assert template.is_up_to_date
+    assert reports['foo'].render(template_name='short') == 'foo'
+    assert not compile.called
+    source, filename, uptodate = env.loader.loaders[0].get_source(
+        env, 'short')
+    assert filename.endswith('short') and uptodate()
+    assert 'report.source' in source
@@ -0,0 +1,84 @@
+import pytest
+
+
+@pytest.fixture
+def ev_store(tmp_path):
+    import pendulum
+    from zeitig import events, store
+
+    ev_store = store.Store(store_path=tmp_path, group='foo')
+    # spans a daylight saving time change in Berlin
+    start = pendulum.datetime(2018, 3, 23, 7, 7, tz='Europe/Berlin')
+    for i, hours in enumerate([2, 1, 3, 18, 4, 0.5, 2, 20, 9, 1, 5, 3]):
+        event_cls = events.BreakEvent if i % 2 else events.WorkEvent
+        ev_store.persist(event_cls(when=start.in_tz('UTC'), tags=[str(i)]))
+        start = start.add(minutes=int(hours * 60) + 7)
+    return ev_store
+
+
+def source_days(ev_store, **kwargs):
+    from zeitig import sourcing, store
+
+    src = sourcing.Sourcerer(
+        store.Store(store_path=ev_store.store_path, group='foo'))
+    return [(str(day.date), day.works.total_seconds(),
+             day.breaks.total_seconds(), day.tags)
+            for day in src.generate_days(**kwargs)]
+
+
+@pytest.mark.parametrize('size', [None, 15 * 60])
+def test_generate_days(ev_store, size, mocker):
+    import collections
+    import pendulum
+    from zeitig import aggregates, events, sourcing
+
+    tz = pendulum.timezone('Europe/Berlin')
+    round = events.Round(size) if size else None
+    end = pendulum.datetime(2018, 3, 30, tz=tz)
+    days = source_days(ev_store, end=end, round=round, tz=tz)
+
+    situations = list(sourcing.Sourcerer(ev_store).generate(
+        end=end, round=round))
+    totals = collections.defaultdict(lambda: [0, 0])
+    for situation in situations:
+        situation.tz = tz
+    for situation in aggregates.split_at_new_day(situations):
+        totals[str(situation.local_start.date())][
+            isinstance(situation, events.Break)]\
+            += situation.local_period.total_seconds()
+    assert [(date, works, breaks) for date, works, breaks, _ in days]\
+        == [(date, works, breaks)
+            for date, (works, breaks) in sorted(totals.items())]
+
+    # closed days are not sourced again
+    generate = mocker.spy(sourcing.Sourcerer, 'generate')
+    assert source_days(ev_store, end=end, round=round, tz=tz) == days
+    assert generate.call_count == 1
+    assert str(generate.call_args[1]['start'].in_tz(tz).date())\
+        == '2018-03-25'
+
+
+def test_generate_days_invalidate(ev_store):
+    import pendulum
+    from zeitig import events, store
+
+    tz = pendulum.timezone('Europe/Berlin')
+    end = pendulum.datetime(2018, 3, 30, tz=tz)
+    days = source_days(ev_store, end=end, tz=tz)
+
+    def stored():
+        rollups = store.Store(store_path=ev_store.store_path,
+                              group='foo').rollups.rollups
+        return sorted(rollups['Europe/Berlin 0'])
+
+    assert stored() == ['2018-03-23', '2018-03-24', '2018-03-25']
+
+    # a tag on the first day does not touch the later days
+    store.Store(store_path=ev_store.store_path, group='foo').persist(
+        events.AddEvent(when=pendulum.datetime(2018, 3, 23, 8, tz=tz),
+                        tags=['bar']))
+    assert stored() == ['2018-03-24', '2018-03-25']
+
+    new_days = source_days(ev_store, end=end, tz=tz)
+    assert new_days[0][3] == ['0', 'bar', '2']
+    assert new_days[1:] == days[1:]
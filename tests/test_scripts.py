@@ -3,3 +3,23 @@ def test_regex_type():
 
     r = scripts.Regex()
     r.convert('.*', None, None)
+
+
+def test_work_does_not_import_reporting(tmp_path):
+    import os
+    import subprocess
+    import sys
+
+    code = ('import sys; from zeitig import scripts; sys.argv[0] = "z"\n'
+            'try:\n    scripts.run()\nexcept SystemExit:\n    pass\n'
+            'print(" ".join(sorted(sys.modules)))')
+    process = subprocess.run(
+        [sys.executable, '-c', code, 'foo', 'work'],
+        env=dict(os.environ, ZEITIG_STORE=str(tmp_path)),
+        stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    modules = process.stdout.split()
+    assert 'zeitig.events' in modules
+    assert 'jinja2' not in modules
+    assert 'zeitig.reporting' not in modules
+    assert 'zeitig.sourcing' not in modules
+    assert 'concurrent.futures' not in modules
@@ -2,14 +2,22 @@ import pytest
 
 
 @pytest.fixture
-def store():
+def store(tmp_path):
     import re
     import collections
+    import functools
     import pendulum
 
-    from zeitig import events, store
+    from zeitig import checkpoints, events, index, utils
 
     class MockedStore:
+        def __init__(self):
+            self.checkpoints = checkpoints.Checkpoints()
+            self.event_cache = utils.LRUCache()
+            self.timestamp_index = index.TimestampIndex(
+                tmp_path.joinpath('index'))
+            self.timestamp_index.rebuild(self.source)
+
         source = collections.OrderedDict([
             ('2018-04-01T07:00:00+00:00', {
                 'when': pendulum.parse('2018-04-01T07:00:00+00:00'),
@@ -78,13 +86,16 @@ def store():
         ])
 
         def iter_names(self):
-            return store.EventSource.from_sequence(self.source)
+            return self.timestamp_index
 
         def load(self, filename):
             dct = self.source[filename]
             print(filename, dct)
             return events.Event(**dct)
 
+        def fetch(self, filename):
+            return functools.partial(self.load, filename)
+
     return MockedStore()
 
 
@@ -152,3 +163,127 @@ def test_sourcerer(store, start, end, result, mocker):
         for situation in situations
     ]
     assert periods == result
+
+
+def test_sourcerer_checkpoint(tmp_path, mocker):
+    import pendulum
+    from zeitig import checkpoints, events, sourcing, store
+
+    mocker.patch.object(checkpoints, 'CHECKPOINT_INTERVAL', 2)
+    ev_store = store.Store(store_path=tmp_path, group='foo')
+    ev_store.persist(events.WorkEvent(
+        when=pendulum.parse('2018-04-01T08:00:00+00:00'), tags=['foo']))
+    for hour, tag in ((9, 'bar'), (10, 'baz'), (11, 'bim')):
+        ev_store.persist(events.AddEvent(
+            when=pendulum.parse(f'2018-04-01T{hour:02}:00:00+00:00'),
+            tags=[tag]))
+
+    def generate():
+        src = sourcing.Sourcerer(
+            store.Store(store_path=tmp_path, group='foo'))
+        return list(src.generate(
+            start=pendulum.parse('2018-04-01T10:30:00+00:00'),
+            end=pendulum.parse('2018-04-01T12:00:00+00:00')))
+
+    situations = generate()
+    assert '2018-04-01T10:00:00+00:00'\
+        in store.Store(store_path=tmp_path, group='foo').checkpoints
+
+    load = mocker.spy(store.Store, 'load')
+    assert [(s.__class__.__name__, s.tags) for s in generate()]\
+        == [(s.__class__.__name__, s.tags) for s in situations]\
+        == [('Work', ['foo', 'bar', 'baz', 'bim'])]
+    assert [call[0][1] for call in load.call_args_list] == [
+        '2018-04-01T11:00:00+00:00']
+
+    # a new event before the checkpoint invalidates it
+    store.Store(store_path=tmp_path, group='foo').persist(events.AddEvent(
+        when=pendulum.parse('2018-04-01T09:30:00+00:00'), tags=['bam']))
+    assert '2018-04-01T10:00:00+00:00'\
+        not in store.Store(store_path=tmp_path, group='foo').checkpoints
+
+
+def test_sourcerer_long_history(tmp_path):
+    import functools
+    import pendulum
+    from zeitig import checkpoints, events, index, sourcing, utils
+
+    start = pendulum.parse('2018-04-01T08:00:00+00:00')
+    names = [str(start.add(minutes=i)) for i in range(3000)]
+
+    class LongStore:
+        def __init__(self):
+            self.checkpoints = checkpoints.Checkpoints()
+            self.event_cache = utils.LRUCache(maxsize=100)
+            self.timestamp_index = index.TimestampIndex(
+                tmp_path.joinpath('index'))
+            self.timestamp_index.rebuild(names)
+
+        def iter_names(self):
+            return self.timestamp_index
+
+        def load(self, name):
+            if name == names[0]:
+                return events.WorkEvent(when=name, tags=['foo'])
+            return events.AddEvent(when=name)
+
+        def fetch(self, name):
+            return functools.partial(self.load, name)
+
+    src = sourcing.Sourcerer(LongStore())
+    situations = list(src.generate(start=start.add(minutes=2999),
+                                   end=start.add(minutes=3000)))
+    assert [(s.__class__.__name__, s.tags) for s in situations]\
+        == [('Work', ['foo'])]
+    assert names[2998] in src.store.checkpoints
+
+
+def test_sourcerer_prefetch(tmp_path, mocker):
+    import pendulum
+    from zeitig import events, sourcing, store
+
+    ev_store = store.Store(store_path=tmp_path, group='foo')
+    start = pendulum.parse('2018-04-01T08:00:00+00:00')
+    for i in range(20):
+        event_cls = events.BreakEvent if i % 5 == 4\
+            else events.WorkEvent if i % 5 == 0 else events.AddEvent
+        ev_store.persist(event_cls(when=start.add(minutes=i), tags=[str(i)]))
+
+    def generate(**kwargs):
+        src = sourcing.Sourcerer(
+            store.Store(store_path=tmp_path, group='foo'), **kwargs)
+        return [(s.__class__.__name__, s.start, s.tags)
+                for s in src.generate(start=start.add(minutes=1),
+                                      end=start.add(minutes=20))]
+
+    fetch = mocker.spy(store.Store, 'fetch')
+    assert generate(workers=4, prefetch=3) == generate(workers=1)
+    assert len(fetch.call_args_list) == 2 * 20
+
+
+def test_sourcerer_generate_async(tmp_path):
+    import asyncio
+    import pendulum
+    from zeitig import events, sourcing, store
+
+    ev_store = store.Store(store_path=tmp_path, group='foo')
+    start = pendulum.parse('2018-04-01T08:00:00+00:00')
+    for i in range(10):
+        event_cls = events.BreakEvent if i % 2 else events.WorkEvent
+        ev_store.persist(event_cls(when=start.add(minutes=i), tags=[str(i)]))
+
+    src = sourcing.Sourcerer(ev_store, prefetch=2)
+    end = start.add(minutes=10)
+
+    async def collect():
+        return [situation async for situation
+                in src.generate_async(start=start, end=end)]
+
+    loop = asyncio.new_event_loop()
+    try:
+        situations = loop.run_until_complete(collect())
+    finally:
+        loop.close()
+    assert [(s.__class__.__name__, s.start, s.tags) for s in situations]\
+        == [(s.__class__.__name__, s.start, s.tags)
+            for s in src.generate(start=start, end=end)]
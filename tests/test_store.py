@@ -0,0 +1,300 @@
+import pytest
+
+
+@pytest.fixture
+def store(tmp_path):
+    from zeitig import store
+
+    return store.Store(store_path=tmp_path, group='foo')
+
+
+def persist_events(store, *whens):
+    import pendulum
+    from zeitig import events
+
+    for i, when in enumerate(whens):
+        event_cls = events.WorkEvent if i % 2 else events.BreakEvent
+        store.persist(event_cls(when=pendulum.parse(when), tags=[str(i)]))
+
+
+def test_pack_segments(store):
+    persist_events(store, '2018-03-31T23:00:00+00:00',
+                   '2018-04-01T08:00:00+00:00')
+    assert store.pack() == 2
+    persist_events(store, '2018-04-01T12:00:00+00:00')
+
+    assert not list(store.source_path.iterdir())
+    assert sorted(path.name for path in store.segments.path.iterdir())\
+        == ['2018-03', '2018-04']
+    assert list(store.iter_names()) == [
+        '2018-03-31T23:00:00+00:00',
+        '2018-04-01T08:00:00+00:00',
+        '2018-04-01T12:00:00+00:00',
+    ]
+    event = store.load('2018-04-01T08:00:00+00:00')
+    assert (event.type, event.tags) == ('work', ['1'])
+
+
+def test_segments_remove_last_created(store):
+    from zeitig import store as zstore
+
+    store.pack()
+    persist_events(store, '2018-04-01T12:00:00+00:00',
+                   '2018-04-01T08:00:00+00:00')
+    last = store.iter_names_created()[-1]
+    assert last.name == '2018-04-01T08:00:00+00:00'
+
+    store.remove(last.name)
+    reopened = zstore.Store(store_path=store.store_path, group='foo')
+    assert list(reopened.iter_names()) == [
+        '2018-04-01T12:00:00+00:00']
+
+
+def test_segments_skip_truncated_record():
+    from zeitig import segments
+
+    data = segments.encode_record('2018-04-01T12:00:00+00:00', 1.0, b'x')
+    records = list(segments.decode_records(data + data[:-1]))
+    assert records == [
+        segments.Record('2018-04-01T12:00:00+00:00', 1.0, b'x')]
+
+
+@pytest.mark.parametrize('many', [False, True])
+def test_segments_append_after_torn_record(store, many):
+    from zeitig import store as zstore
+
+    store.pack()
+    persist_events(store, '2018-04-01T08:00:00+00:00')
+    path = store.segments.segment_path('2018-04')
+    data = path.read_bytes()
+    # a crash while appending the next record
+    path.write_bytes(data + data[:-5])
+
+    reopened = zstore.Store(store_path=store.store_path, group='foo')
+    if many:
+        reopened.segments.append_many(
+            [('2018-04-01T12:00:00+00:00', b'x', None)])
+    else:
+        reopened.segments.append('2018-04-01T12:00:00+00:00', b'x')
+
+    assert path.stat().st_size < 2 * len(data)
+    reopened = zstore.Store(store_path=store.store_path, group='foo')
+    assert reopened.segments.names() == [
+        '2018-04-01T08:00:00+00:00', '2018-04-01T12:00:00+00:00']
+    assert reopened.segments.read('2018-04-01T12:00:00+00:00') == b'x'
+
+
+def test_index_range(store):
+    import pendulum
+    from zeitig import utils
+
+    persist_events(store, '2018-04-01T12:00:00+00:00',
+                   '2018-04-01T08:00:00+00:00',
+                   '2018-04-01T10:00:00.500000+00:00')
+    # an event file added behind the back of the index
+    store.source_path.joinpath('2018-04-01T09:00:00+00:00').write_text(
+        "when = 2018-04-01T09:00:00Z\ntype = 'add'\n")
+
+    timeline = store.iter_names()
+    position = timeline.bisect(utils.epoch_micros(
+        pendulum.parse('2018-04-01T09:00:00+00:00')))
+    assert [timeline.name(p) for p in range(position - 1, len(timeline))]\
+        == [
+            '2018-04-01T08:00:00+00:00',
+            '2018-04-01T09:00:00+00:00',
+            '2018-04-01T10:00:00.500000+00:00',
+            '2018-04-01T12:00:00+00:00',
+    ]
+
+    store.remove('2018-04-01T09:00:00+00:00')
+    assert store.timestamp_index.names() == [
+        '2018-04-01T08:00:00+00:00',
+        '2018-04-01T10:00:00.500000+00:00',
+        '2018-04-01T12:00:00+00:00',
+    ]
+
+
+def test_index_before_epoch(tmp_path):
+    import pendulum
+    from zeitig import index, utils
+
+    timestamp_index = index.TimestampIndex(tmp_path.joinpath('index'))
+    timestamp_index.rebuild(['1970-01-01T00:00:00+00:00',
+                             '1969-12-31T23:00:00+00:00'])
+    timestamp_index.insert('1969-12-31T22:00:00+00:00')
+    assert not timestamp_index.insert_many(['1969-12-31T23:30:00+00:00'])
+    assert timestamp_index.insert_many(['1970-01-01T01:00:00+00:00'])
+
+    assert timestamp_index.names() == [
+        '1969-12-31T22:00:00+00:00',
+        '1969-12-31T23:00:00+00:00',
+        '1970-01-01T00:00:00+00:00',
+        '1970-01-01T01:00:00+00:00',
+    ]
+    assert timestamp_index.bisect(utils.epoch_micros(
+        pendulum.parse('1969-12-31T23:30:00+00:00'))) == 2
+
+
+def test_index_same_tick(store):
+    import os
+
+    persist_events(store, '2018-04-01T08:00:00+00:00')
+    store.fresh_timestamp_index()
+    persist_events(store, '2018-04-01T10:00:00+00:00')
+    assert store.timestamp_index.is_fresh()
+    # an event written within the timestamp resolution of the index
+    stat = store.source_path.stat()
+    store.source_path.joinpath('2018-04-01T09:00:00+00:00').write_text(
+        "when = 2018-04-01T09:00:00Z\ntype = 'break'\n")
+    os.utime(str(store.source_path), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert not store.timestamp_index.is_fresh()
+    assert store.fresh_timestamp_index().names() == [
+        '2018-04-01T08:00:00+00:00', '2018-04-01T09:00:00+00:00',
+        '2018-04-01T10:00:00+00:00']
+    assert store.timestamp_index.is_fresh()
+
+
+def test_source_cache(store, mocker):
+    import qtoml
+    from zeitig import store as zstore
+
+    persist_events(store, '2018-04-01T08:00:00+00:00')
+    event = store.load('2018-04-01T08:00:00+00:00')
+    store.flush()
+
+    loads = mocker.spy(qtoml, 'loads')
+    reopened = zstore.Store(store_path=store.store_path, group='foo')
+    cached_event = reopened.load('2018-04-01T08:00:00+00:00')
+    assert not loads.called
+    assert dict(cached_event) == dict(event)
+
+    # a rewritten file is decoded again
+    reopened.source_path.joinpath('2018-04-01T08:00:00+00:00').write_text(
+        "when = 2018-04-01T08:00:00Z\ntype = 'break'\ntags = ['foo']\n")
+    event = reopened.load('2018-04-01T08:00:00+00:00')
+    assert loads.called
+    assert (event.type, event.tags) == ('break', ['foo'])
+
+
+def test_source_cache_prune(store):
+    from zeitig import store as zstore
+
+    persist_events(store, '2018-04-01T08:00:00+00:00',
+                   '2018-04-01T09:00:00+00:00')
+    # marshal does not know TOML dates
+    store.source_path.joinpath('2018-04-01T10:00:00+00:00').write_text(
+        "when = 2018-04-01T10:00:00Z\ntype = 'add'\nday = 2018-04-01\n")
+    for name in store.iter_names():
+        store.load(name)
+    store.remove('2018-04-01T08:00:00+00:00')
+    store.flush()
+
+    reopened = zstore.Store(store_path=store.store_path, group='foo')
+    assert list(reopened.source_cache.entries) == [
+        '2018-04-01T09:00:00+00:00']
+    assert reopened.load('2018-04-01T10:00:00+00:00').type == 'add'
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_source_groups(tmp_path, processes):
+    import pendulum
+    from zeitig import store as zstore
+
+    persist_events(zstore.Store(store_path=tmp_path, group='foo'),
+                   '2018-04-01T08:00:00+00:00', '2018-04-01T10:00:00+00:00',
+                   '2018-04-01T12:00:00+00:00')
+    persist_events(zstore.Store(store_path=tmp_path, group='bar'),
+                   '2018-04-01T09:00:00+00:00', '2018-04-01T11:00:00+00:00')
+
+    situations = zstore.Store(store_path=tmp_path).source_groups(
+        end=pendulum.parse('2018-04-01T13:00:00+00:00'),
+        processes=processes)
+    assert [(s.group, s.__class__.__name__, str(s.start))
+            for s in situations] == [
+        ('foo', 'Break', '2018-04-01T08:00:00+00:00'),
+        ('bar', 'Break', '2018-04-01T09:00:00+00:00'),
+        ('foo', 'Work', '2018-04-01T10:00:00+00:00'),
+        ('bar', 'Work', '2018-04-01T11:00:00+00:00'),
+        ('foo', 'Break', '2018-04-01T12:00:00+00:00'),
+    ]
+
+
+def test_head(store, mocker):
+    import os
+    import pendulum
+    from zeitig import events, sourcing, store as zstore
+
+    persist_events(store, '2018-04-01T08:00:00+00:00',
+                   '2018-04-01T09:00:00+00:00')
+    store.persist(events.AddEvent(
+        when=pendulum.parse('2018-04-01T10:00:00+00:00'), tags=['x'],
+        note='foo'))
+    # the head is missing without any sourced situation
+    assert sourcing.Sourcerer(store).current_situation().tags == ['1', 'x']
+    store.persist(events.RemoveEvent(
+        when=pendulum.parse('2018-04-01T11:00:00+00:00'), tags=['1']))
+
+    reopened = zstore.Store(store_path=store.store_path, group='foo')
+    iter_names_created = mocker.spy(reopened, 'iter_names_created')
+    iter_names = mocker.spy(reopened, 'iter_names')
+    location = reopened.last_location()
+    assert location.name == '2018-04-01T11:00:00+00:00'
+    situation = sourcing.Sourcerer(reopened).current_situation()
+    assert isinstance(situation, events.Work)
+    assert (str(situation.start), situation.tags, situation.notes) == (
+        '2018-04-01T09:00:00+00:00', ['x'], ['foo'])
+    assert not iter_names_created.called
+    assert not iter_names.called
+
+    # a past event is created last, but the situation has to be sourced
+    persist_events(store, '2018-04-01T07:00:00+00:00')
+    reopened = zstore.Store(store_path=store.store_path, group='foo')
+    assert reopened.last_location().name == '2018-04-01T07:00:00+00:00'
+    assert sourcing.Sourcerer(reopened).current_situation().tags == ['x']
+
+    reopened.remove('2018-04-01T07:00:00+00:00')
+    assert reopened.last_location().name == '2018-04-01T11:00:00+00:00'
+
+    # events touched by hand
+    store.source_path.joinpath('2018-04-01T12:00:00+00:00').write_text(
+        'type = "break"\nwhen = "2018-04-01T12:00:00+00:00"\n')
+    reopened = zstore.Store(store_path=store.store_path, group='foo')
+    assert isinstance(sourcing.Sourcerer(reopened).current_situation(),
+                      events.Break)
+
+    # within the timestamp resolution of the head
+    stat = store.source_path.stat()
+    store.source_path.joinpath('2018-04-01T13:00:00+00:00').write_text(
+        'type = "work"\nwhen = "2018-04-01T13:00:00+00:00"\n')
+    os.utime(str(store.source_path), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    reopened = zstore.Store(store_path=store.store_path, group='foo')
+    assert isinstance(sourcing.Sourcerer(reopened).current_situation(),
+                      events.Work)
+
+
+@pytest.mark.parametrize('packed', [False, True])
+def test_persist_many(store, mocker, packed):
+    import pendulum
+    from zeitig import events, sourcing, store as zstore, utils
+
+    if packed:
+        store.pack()
+    persist_events(store, '2018-04-01T08:00:00+00:00')
+    fsync_dir = mocker.spy(utils, 'fsync_dir')
+    link_last_path = mocker.spy(store, 'link_last_path')
+    whens = ['2018-04-01T09:00:00+00:00', '2018-04-01T10:00:00+00:00',
+             '2018-04-01T11:00:00+00:00', '2018-04-01T07:00:00+00:00',
+             '2018-04-01T12:00:00+00:00']
+    count = store.persist_many(
+        (events.WorkEvent(when=pendulum.parse(when), tags=[str(i)])
+         for i, when in enumerate(whens)), batch_size=2)
+
+    assert count == 5
+    assert fsync_dir.call_count == 3
+    assert link_last_path.call_count == 1
+    reopened = zstore.Store(store_path=store.store_path, group='foo')
+    assert list(reopened.iter_names()) == sorted(
+        whens + ['2018-04-01T08:00:00+00:00'])
+    assert reopened.last_location().name == '2018-04-01T12:00:00+00:00'
+    assert sourcing.Sourcerer(reopened).current_situation().tags == ['4']
@@ -0,0 +1,72 @@
+import pytest
+
+
+@pytest.mark.parametrize('tz_name', [
+    'Europe/Berlin', 'America/Santiago', 'Australia/Lord_Howe', 'UTC'])
+def test_transition_table(tz_name):
+    import pendulum
+    from zeitig import timezones, utils
+
+    tz = pendulum.timezone(tz_name)
+    table = timezones.TransitionTable(tz)
+    start = pendulum.datetime(2017, 12, 25)
+    # every 7 hours and 13 minutes over two years
+    for step in range(0, 2 * 365 * 24 * 60, 7 * 60 + 13):
+        when = start.add(minutes=step)
+        micros = utils.epoch_micros(when)
+        local = when.in_tz(tz)
+        assert table.local_datetime(micros).isoformat() == local.isoformat()
+        assert table.day(micros) == (local.date()
+                                     - pendulum.date(1970, 1, 1)).days
+        assert table.midnight(table.day(micros))\
+            == utils.epoch_micros(local.start_of('day'))
+
+
+def test_transition_table_ambiguous():
+    import pendulum
+    from zeitig import timezones, utils
+
+    table = timezones.get_table('Europe/Berlin')
+    first = pendulum.parse('2018-10-28T00:30:00+00:00')
+    second = pendulum.parse('2018-10-28T01:30:00+00:00')
+    local = table.local(utils.epoch_micros(first))
+    assert local == table.local(utils.epoch_micros(second))
+    # like pendulum the later time is used
+    assert table.utc(local) == utils.epoch_micros(second)
+    assert table.local_datetime(utils.epoch_micros(first)).fold == 0
+    assert table.local_datetime(utils.epoch_micros(second)).fold == 1
+
+    # non existing times are shifted forward
+    gap = table.local(utils.epoch_micros(
+        pendulum.parse('2018-03-25T01:00:00+00:00'))) - 30 * 60 * 1000000
+    assert table.utc(gap) == utils.epoch_micros(
+        pendulum.parse('2018-03-25T01:30:00+00:00'))
+
+    times, offsets = table.span(utils.epoch_micros(first) - 1,
+                                utils.epoch_micros(second))
+    assert times == [utils.epoch_micros(first) - 1,
+                     utils.epoch_micros(pendulum.parse(
+                         '2018-10-28T01:00:00+00:00'))]
+    assert offsets == [7200 * 1000000, 3600 * 1000000]
+
+
+def test_transition_table_threads():
+    import concurrent.futures
+    import pendulum
+    from zeitig import timezones, utils
+
+    tz = pendulum.timezone('Europe/Berlin')
+    table = timezones.TransitionTable(tz)
+    # threads extend the table in both directions while others read it
+    whens = [pendulum.datetime(year, month, 15, tz='UTC')
+             for year in range(1990, 2030) for month in (1, 7)]
+
+    def offset(when):
+        return table.offset(utils.epoch_micros(when))
+
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        offsets = list(executor.map(offset, whens[::-1] + whens))
+    assert offsets == [when.in_tz(tz).offset * 1000000
+                       for when in whens[::-1] + whens]
+    assert len(table.times) == len(table.offsets)
+    assert table.times == sorted(table.times)
@@ -0,0 +1,105 @@
+import pytest
+
+
+def test_lru_cache_size():
+    from zeitig import utils
+
+    cache = utils.LRUCache(maxsize=2)
+    cache['a'], cache['b'] = 1, 2
+    assert cache['a'] == 1
+    cache['c'] = 3
+
+    assert 'b' not in cache
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 0, 1)
+
+
+def test_lru_cache_bytes():
+    from zeitig import utils
+
+    cache = utils.LRUCache(maxbytes=10, sizeof=len)
+    cache['a'] = 'x' * 6
+    cache['b'] = 'y' * 4
+    cache['c'] = 'z'
+
+    with pytest.raises(KeyError):
+        cache['a']
+    assert (len(cache), cache.bytes, cache.misses) == (2, 5, 1)
+
+
+@pytest.mark.parametrize('value', [
+    '2018-04-01T08:00:00+00:00',
+    '2018-04-01T08:00:00.500000+00:00',
+    '2018-04-01T08:00:00Z',
+    '2018-04-01T10:00:00+02:00',
+    '2018-04-01 08:00',
+])
+def test_parse_utc(value):
+    import pendulum
+    from zeitig import utils
+
+    when = utils.parse_utc(value)
+    assert when == pendulum.parse(value)
+    assert when.timezone_name == 'UTC'
+
+
+def test_read_ahead():
+    from zeitig import utils
+
+    assert list(utils.read_ahead(range(100), maxsize=3)) == list(range(100))
+
+    def fail():
+        yield 1
+        raise ValueError('foo')
+
+    items = utils.read_ahead(fail())
+    assert next(items) == 1
+    with pytest.raises(ValueError):
+        next(items)
+
+
+def test_iterate_async():
+    import asyncio
+    import time
+    from zeitig import utils
+
+    def slow():
+        for i in range(5):
+            time.sleep(0.02)
+            yield i
+
+    async def collect(iterable, **kwargs):
+        return [item async for item in utils.iterate_async(iterable, **kwargs)]
+
+    async def ticking():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        ticker = asyncio.ensure_future(tick())
+        try:
+            items = await collect(slow())
+        finally:
+            ticker.cancel()
+        return items, ticks
+
+    def fail():
+        yield 1
+        raise ValueError('foo')
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(
+            collect(range(100), maxsize=3)) == list(range(100))
+        items, ticks = loop.run_until_complete(ticking())
+        assert items == list(range(5))
+        # the loop keeps running, while the thread waits for the items
+        assert ticks > 5
+        with pytest.raises(ValueError):
+            loop.run_until_complete(collect(fail()))
+    finally:
+        loop.close()
+